@@ -1,22 +1,146 @@
-import subprocess
+import argparse
 import time
+from emulatorConsole import EmulatorConsole, ConsoleGroup, ConsoleError, ACK_WINDOW, Payload, prepare
 
 EMULATOR_HOST = "localhost"
 EMULATOR_PORT = 5554
+SENSOR_NAMES = {"acc": "acceleration", "gyr": "gyroscope", "mag": "magnetic-field"}
 
-proc = subprocess.Popen(
-	["nc", EMULATOR_HOST, str(EMULATOR_PORT)],
-	stdin=subprocess.PIPE,
-	stdout=subprocess.PIPE,
-	stderr=subprocess.STDOUT,
-	text=True,
-	bufsize=1
-)
+console = None
+deadband = None
+
+# skips a "sensor set" when every axis moved less than the epsilon of that
+# sensor since the last value sent for it, unless keepalive_ns have passed
+# since then. epsilon maps sensor names to thresholds in the sensor's own
+# unit, sensors without one are always sent.
+class Deadband:
+	def __init__(self, epsilon, keepalive_ns):
+		self.epsilon = epsilon # "acceleration" -> threshold
+		self.keepalive_ns = keepalive_ns
+		self.last = {} # "sensor set <name>" -> (values, sent_ns)
+		self.suppressed = 0
+
+	def accept(self, cmd, now):
+		head, _, text = cmd.rpartition(" ")
+		if not head.startswith("sensor set "):
+			return True
+		epsilon = self.epsilon.get(head[len("sensor set "):])
+		if epsilon is None:
+			return True
+		try:
+			values = [float(v) for v in text.split(":")]
+		except ValueError:
+			return True
+		prev = self.last.get(head)
+		if (prev is not None and now - prev[1] < self.keepalive_ns
+				and len(values) == len(prev[0])
+				and all(abs(v - p) < epsilon for v, p in zip(values, prev[0]))):
+			self.suppressed += 1
+			return False
+		self.last[head] = (values, now)
+		return True
+
+# one console per port, several ports are written to as a group.
+# a connection already open to the same ports is kept for the new run.
+def connect(ports=None, host=EMULATOR_HOST):
+	global console
+	if not ports:
+		ports = [EMULATOR_PORT]
+	if console is not None and [(c.host, c.port) for c in targets()] == [(host, p) for p in ports]:
+		try:
+			console.reset()
+			return console
+		except (ConsoleError, OSError):
+			pass # emulator restarted, connect again
+	disconnect()
+	consoles = [EmulatorConsole(host, port) for port in ports]
+	console = consoles[0] if len(consoles) == 1 else ConsoleGroup(consoles)
+	return console
+
+def disconnect():
+	global console
+	if console is not None:
+		try:
+			console.close()
+		except (ConsoleError, OSError):
+			pass
+		console = None
+
+def targets():
+	if console is None:
+		return []
+	return getattr(console, "consoles", [console])
+
+# argparse type of --deadband: acc=0.01,gyr=0.001,mag=0.1
+def deadbandSpec(text):
+	epsilon = {}
+	for item in text.split(","):
+		key, sep, value = item.partition("=")
+		if not sep or key.strip() not in SENSOR_NAMES:
+			raise argparse.ArgumentTypeError(f"expected SENSOR=EPS pairs with SENSOR in {','.join(SENSOR_NAMES)}, got {item!r}")
+		try:
+			epsilon[SENSOR_NAMES[key.strip()]] = float(value)
+		except ValueError:
+			raise argparse.ArgumentTypeError(f"invalid threshold {value!r} for {key}")
+	return epsilon
+
+def addArguments(parser):
+	parser.add_argument("-e", "--emulator", type=int, nargs="+", default=[EMULATOR_PORT], metavar="PORT", help="console ports of the target emulators")
+	parser.add_argument("--deadband", type=deadbandSpec, metavar="SENSOR=EPS,...", help="skip updates of a sensor where every axis changed less than its EPS, in the sensor's unit, e.g. acc=0.01,gyr=0.001,mag=0.1 (m/s^2, rad/s, uT)")
+	parser.add_argument("--keepalive", type=float, default=200, metavar="MS", help="with --deadband, resend an unchanged sensor after MS milliseconds")
+
+# epsilon ({sensor name: threshold}) None turns the filter off
+def setDeadband(epsilon, keepalive_ms=200):
+	global deadband
+	deadband = Deadband(epsilon, keepalive_ms * 1000000) if epsilon is not None else None
+
+def suppressed():
+	return deadband.suppressed if deadband else 0
+
+# verbose sends stop waiting for each reply:
+# errors are printed by the console reader as they arrive
+def pipeline(window=ACK_WINDOW):
+	(console or connect()).pipeline(window)
+
+# wait for outstanding replies, returns the number of KO answers
+def finish():
+	if console is None:
+		return 0
+	console.drain()
+	return len(console.errors)
+
+# per target write durations and gaps between writes
+def histograms():
+	h = {}
+	for c in targets():
+		h[f"send_{c.port}"] = c.send_ns
+		h[f"gap_{c.port}"] = c.gap_ns
+	return h
 
 def send(cmd: str, verbose: bool = False):
-	proc.stdin.write(cmd + "\n")
-	proc.stdin.flush()
-	if verbose:
-		out = proc.stdout.readline().strip()
+	if deadband and not deadband.accept(cmd, time.monotonic_ns()):
+		return
+	out = (console or connect()).send(cmd, verbose)
+	if verbose and out is not None:
 		print(f"{time.time():.3f}> {cmd}")
-		if out != "OK": print(out)
\ No newline at end of file
+		if out != "OK": print(out)
+
+# the commands of one tick in a single write, optionally reordered by sensor
+def send_many(cmds, verbose: bool = False, order=None):
+	send_prepared(prepare(cmds, order), verbose)
+
+# payload from prepare(), encoded before the timed part of the injection
+def send_prepared(payload, verbose: bool = False):
+	if deadband:
+		now = time.monotonic_ns()
+		cmds = [cmd for cmd in payload.cmds if deadband.accept(cmd, now)]
+		if not cmds:
+			return
+		if len(cmds) < payload.n:
+			payload = prepare(cmds)
+	outs = (console or connect()).send_prepared(payload, verbose)
+	if verbose and outs is not None:
+		now = time.time()
+		for cmd, out in zip(payload.cmds, outs):
+			print(f"{now:.3f}> {cmd}")
+			if out != "OK": print(out)
\ No newline at end of file
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+# injection throughput benchmark against the fake console.
+# runs mock.py, interp.py and inject.py (exact and --period) over the
+# SensorCSV frequency matrix and reports achieved rate, cpu time per
+# injection, pacing lateness and startup time (spawn to first command
+# received), optionally compared to a stored baseline.
+
+import argparse
+import csv
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+S2NS = 1000000000
+
+# same matrix as testInjection.py
+MAGNITUDES = ["Lower", "Normal", "Higher"]
+FREQUENCIES = ["50", "100", "200", "500", "1000", "0"]
+DELAYS = ["Game", "Fastest"]
+
+parser = argparse.ArgumentParser(description="injection throughput benchmark")
+parser.add_argument("--modes", nargs="+", default=["mock", "interp", "exact", "period"], choices=("mock", "interp", "exact", "period"))
+parser.add_argument("--walk", help="recording used by interp, exact and period (skipped without it)")
+parser.add_argument("--magnitudes", nargs="+", default=MAGNITUDES, choices=MAGNITUDES)
+parser.add_argument("--frequencies", nargs="+", default=FREQUENCIES)
+parser.add_argument("--delays", nargs="+", default=DELAYS, choices=DELAYS)
+parser.add_argument("--port", type=int, default=5580, help="port of the fake console")
+parser.add_argument("-o", "--output", default="benchmark.json", help="machine readable results")
+parser.add_argument("--baseline", help="results of a previous run to compare against")
+parser.add_argument("--tolerance", type=float, default=0.10, help="relative slack before a difference counts as a regression")
+parser.add_argument("--startup-budget", type=float, default=1000, metavar="MS", help="longest accepted time from spawning an injector to its first command")
+
+def cases(args):
+	for mode in args.modes:
+		if mode == "mock":
+			for magnitude in args.magnitudes:
+				for frequency in args.frequencies:
+					for delay in args.delays:
+						yield f"mock_{magnitude}_{frequency}_{delay}", int(frequency), \
+							["mock.py", magnitude, frequency, delay]
+		elif not args.walk:
+			continue
+		elif mode == "interp":
+			for frequency in args.frequencies:
+				yield f"interp_{frequency}", int(frequency), ["interp.py", args.walk, frequency, "cubic"]
+		elif mode == "exact":
+			yield "exact", None, ["inject.py", "-a", args.walk]
+		elif mode == "period":
+			for frequency in args.frequencies:
+				if frequency != "0":
+					yield f"period_{frequency}", int(frequency), \
+						["inject.py", "-a", "--period", f"{1000/int(frequency)}", args.walk]
+
+def startConsole(port, trace):
+	proc = subprocess.Popen(
+		[sys.executable, os.path.join(REPO, "fakeEmulator.py"), str(port), "--trace", trace],
+		stdout=subprocess.PIPE,
+		text=True
+	)
+	if "listening" not in proc.stdout.readline():
+		proc.kill()
+		raise RuntimeError("fake console did not start")
+	return proc
+
+def stopConsole(proc):
+	proc.send_signal(signal.SIGINT)
+	proc.communicate(timeout=30)
+
+def readTrace(trace):
+	with open(trace, newline="") as f:
+		reader = csv.DictReader(f)
+		return [int(row["recv_ns"]) for row in reader if row["sensor"] == "acceleration"]
+
+def run(name, target, cmd, port, workdir):
+	trace = os.path.join(workdir, f"{name}.trace.csv")
+	stats = os.path.join(workdir, f"{name}.stats.json")
+	console = startConsole(port, trace)
+	try:
+		before = resource.getrusage(resource.RUSAGE_CHILDREN)
+		start = time.monotonic_ns()
+		proc = subprocess.run(
+			[sys.executable, os.path.join(REPO, cmd[0])] + cmd[1:] + ["-e", str(port), "--stats", stats],
+			cwd=workdir,
+			stdout=subprocess.PIPE,
+			text=True,
+			check=True
+		)
+		wall = time.monotonic_ns() - start
+		after = resource.getrusage(resource.RUSAGE_CHILDREN)
+	finally:
+		stopConsole(console)
+
+	received = readTrace(trace)
+	with open(stats) as f:
+		summary = json.load(f)
+	span = (received[-1] - received[0]) if len(received) > 1 else 0
+	cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+	phases = next((line[len("startup: "):] for line in proc.stdout.splitlines() if line.startswith("startup: ")), "")
+	lateness = summary.get("lateness", {})
+	send = summary.get(f"send_{port}", {})
+	return {
+		"name": name,
+		"target_hz": target or None,
+		"achieved_hz": (len(received) - 1) * S2NS / span if span else 0.0,
+		"injections": len(received),
+		"wall_s": wall / S2NS,
+		"startup_ms": (received[0] - start) / 1000000 if received else 0.0,
+		"startup_phases": phases,
+		"cpu_us_per_injection": cpu * 1000000 / len(received) if received else 0.0,
+		"send_p99_us": send.get("p99_us", 0.0),
+		"lateness_p50_us": lateness.get("p50_us", 0.0),
+		"lateness_p99_us": lateness.get("p99_us", 0.0),
+		"lateness_p99.9_us": lateness.get("p99.9_us", 0.0),
+		"lateness_max_us": lateness.get("max_us", 0.0),
+	}
+
+# lower rate or more cpu / lateness than the baseline beyond the tolerance
+def regressions(results, baseline, tolerance):
+	found = []
+	old = {r["name"]: r for r in baseline}
+	for r in results:
+		b = old.get(r["name"])
+		if b is None:
+			continue
+		if r["achieved_hz"] < b["achieved_hz"] * (1 - tolerance):
+			found.append(f"{r['name']}: achieved {r['achieved_hz']:.1f} Hz, baseline {b['achieved_hz']:.1f} Hz")
+		for key in ("cpu_us_per_injection", "lateness_p99_us", "startup_ms"):
+			# 5us (5ms for startup) of absolute slack keeps near zero values from flapping
+			if key in b and r[key] > b[key] * (1 + tolerance) + 5:
+				found.append(f"{r['name']}: {key} {r[key]:.1f}, baseline {b[key]:.1f}")
+	return found
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	if args.walk:
+		args.walk = os.path.abspath(args.walk)
+
+	results = []
+	with tempfile.TemporaryDirectory() as workdir:
+		os.makedirs(os.path.join(workdir, "send"))
+		for name, target, cmd in cases(args):
+			r = run(name, target, cmd, args.port, workdir)
+			results.append(r)
+			print(f"{name}: {r['achieved_hz']:.1f} Hz, {r['cpu_us_per_injection']:.1f} us cpu/injection, "
+				f"lateness p99 {r['lateness_p99_us']:.1f} us, startup {r['startup_ms']:.0f} ms ({r['startup_phases']})", flush=True)
+
+	with open(args.output, "w") as f:
+		json.dump(results, f, indent=1)
+	print(f"results written to {args.output}")
+
+	# spawn to first command, the budget holds with or without a baseline
+	slow = [r for r in results if r["startup_ms"] > args.startup_budget]
+	for r in slow:
+		print(f"STARTUP {r['name']}: {r['startup_ms']:.0f} ms, budget {args.startup_budget:.0f} ms")
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			found = regressions(results, json.load(f), args.tolerance)
+		for line in found:
+			print(f"REGRESSION {line}")
+		if found:
+			exit(1)
+		print("no regressions against baseline")
+	if slow:
+		exit(1)
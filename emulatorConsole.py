@@ -0,0 +1,329 @@
+import os
+import select
+import selectors
+import socket
+import threading
+import time
+from collections import deque, namedtuple
+from latency import Histogram
+
+AUTH_TOKEN_PATH = os.path.expanduser("~/.emulator_console_auth_token")
+HANDSHAKE_TIMEOUT = 5.0 # seconds
+IDLE_POLL = 0.05 # seconds between checks for the end of pipelined mode while nothing is pending
+ACK_WINDOW = 32 # commands in flight before send() blocks in pipelined mode
+
+class ConsoleError(Exception):
+	pass
+
+# n commands encoded ahead of time, written with send_prepared().
+# only the bytes are kept: the command strings are decoded again when
+# something needs them (pipelined replies, the deadband, verbose output)
+class Payload(namedtuple("Payload", "data n")):
+	__slots__ = ()
+
+	@property
+	def cmds(self):
+		return bytes(self.data).decode().split("\n")[:-1]
+
+# order lists sensor names ("magnetic-field", "acceleration", ...) that go first,
+# in that order. the other commands follow as given.
+def prepare(cmds, order=None):
+	cmds = tuple(cmds)
+	if order:
+		rank = {name: i for i, name in enumerate(order)}
+		cmds = tuple(sorted(cmds, key=lambda cmd: rank.get(sensorName(cmd), len(rank))))
+	return Payload("".join(cmd + "\n" for cmd in cmds).encode(), len(cmds))
+
+def sensorName(cmd):
+	words = cmd.split(" ", 3)
+	return words[2] if len(words) > 2 and words[0] == "sensor" else None
+
+# direct TCP client for the android emulator console.
+# replaces the `nc` relay process: commands go straight from this
+# process to the emulator socket.
+class EmulatorConsole:
+	def __init__(self, host="localhost", port=5554, token_path=AUTH_TOKEN_PATH):
+		self.host = host
+		self.port = port
+		self.sock = socket.create_connection((host, port), timeout=HANDSHAKE_TIMEOUT)
+		self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self._buf = bytearray()
+		self._unread = 0 # replies of non verbose commands still in the socket
+		self._pending = None # (cmd, timestamp) awaiting a reply, pipelined mode only
+		self.errors = []
+		self.send_ns = Histogram() # duration of each write
+		self.gap_ns = Histogram() # time between the starts of consecutive writes
+		self._last_write = None
+		self.label = "" # prefix of the replies reported by the pipelined reader
+
+		banner = self._handshake()
+		if "Authentication required" in banner:
+			self._auth(token_path)
+		self.sock.settimeout(None)
+
+	def _readline(self):
+		while True:
+			i = self._buf.find(b"\n")
+			if i >= 0:
+				line = self._buf[:i]
+				del self._buf[:i+1]
+				return line.decode(errors="replace").strip()
+			chunk = self.sock.recv(4096)
+			if not chunk:
+				raise ConsoleError(f"console {self.host}:{self.port} closed the connection")
+			self._buf += chunk
+
+	# the banner ends with a line containing only OK
+	def _handshake(self):
+		lines = []
+		while True:
+			line = self._readline()
+			if line == "OK":
+				return "\n".join(lines)
+			if line.startswith("KO"):
+				raise ConsoleError(line)
+			lines.append(line)
+
+	def _auth(self, token_path):
+		try:
+			with open(token_path) as f:
+				token = f.read().strip()
+		except OSError as e:
+			raise ConsoleError(f"console requires auth but token is unreadable: {e}")
+		self.sock.sendall(f"auth {token}\n".encode())
+		self._handshake()
+
+	# discard replies to commands sent without verbose
+	def _skip(self):
+		while self._unread > 0:
+			self._readline()
+			self._unread -= 1
+
+	# the same without waiting: only the replies that already arrived.
+	# runs after every non verbose write so the socket buffers never fill
+	# up and block the emulator, and this process, on long runs
+	def _discard(self):
+		while True:
+			try:
+				chunk = self.sock.recv(65536, socket.MSG_DONTWAIT)
+			except BlockingIOError:
+				break
+			if not chunk:
+				raise ConsoleError(f"console {self.host}:{self.port} closed the connection")
+			self._buf += chunk
+		while self._unread > 0:
+			i = self._buf.find(b"\n")
+			if i < 0:
+				break
+			del self._buf[:i+1]
+			self._unread -= 1
+
+	# replies are matched to commands in order by a background reader,
+	# so sending never waits for a round-trip unless the write would leave
+	# more than `window` commands unanswered. a payload larger than the
+	# window waits for every earlier reply and is then written whole.
+	# on_error(timestamp, cmd, reply) runs on the reader thread for every
+	# reply that is not OK.
+	def pipeline(self, window=ACK_WINDOW, on_error=None):
+		if self._pending is not None:
+			return
+		self._skip()
+		self._pending = deque()
+		self._window = max(1, window)
+		self._idle = threading.Condition() # notified on every reply
+		self._on_error = on_error or printError
+		self._stop = threading.Event()
+		self._reader = threading.Thread(target=self._readReplies, daemon=True)
+		self._reader.start()
+
+	# back to sends that answer for themselves, once every reply has arrived.
+	# the connection can then be reused by a run that does not pipeline.
+	def unpipeline(self, timeout=HANDSHAKE_TIMEOUT):
+		if self._pending is None:
+			return
+		if not self.drain(timeout) or not self._reader.is_alive():
+			raise ConsoleError(f"console {self.host}:{self.port} stopped answering")
+		self._stop.set()
+		self._reader.join()
+		self._pending = None
+
+	def _readReplies(self):
+		try:
+			while True:
+				# with nothing owed the reader only waits, so that unpipeline() can stop it
+				if not self._pending and b"\n" not in self._buf:
+					if self._stop.is_set():
+						return
+					if not select.select([self.sock], [], [], IDLE_POLL)[0]:
+						continue
+				reply = self._readline()
+				cmd, ts = self._pending.popleft()
+				if reply != "OK":
+					self.errors.append((ts, cmd, reply))
+					self._on_error(ts, cmd, self.label + reply)
+				with self._idle:
+					self._idle.notify_all()
+		except (ConsoleError, OSError):
+			with self._idle:
+				self._idle.notify_all()
+
+	def _track(self, cmds):
+		n = len(cmds)
+		with self._idle:
+			self._idle.wait_for(lambda: not self._pending or len(self._pending) + n <= self._window or not self._reader.is_alive())
+			if not self._reader.is_alive():
+				raise ConsoleError(f"console {self.host}:{self.port} stopped answering")
+			ts = time.time()
+			self._pending.extend((cmd, ts) for cmd in cmds)
+
+	# wait until every pipelined command has been answered
+	def drain(self, timeout=None):
+		if self._pending is None:
+			return True
+		with self._idle:
+			return self._idle.wait_for(lambda: not self._pending or not self._reader.is_alive(), timeout)
+
+	# bookkeeping around a write of n commands,
+	# split out so that ConsoleGroup can do the writing itself
+	def _before(self, payload):
+		if self._pending is not None:
+			self._track(payload.cmds)
+
+	def _after(self, n, verbose):
+		if self._pending is not None:
+			return None
+		if verbose:
+			self._skip()
+			return [self._readline() for _ in range(n)]
+		self._unread += n
+		self._discard()
+
+	def _written(self, start, end):
+		self.send_ns.record(end - start)
+		if self._last_write is not None:
+			self.gap_ns.record(start - self._last_write)
+		self._last_write = start
+
+	def _write(self, data):
+		t = time.monotonic_ns()
+		self.sock.sendall(data)
+		self._written(t, time.monotonic_ns())
+
+	def send(self, cmd: str, verbose: bool = False):
+		out = self.send_prepared(Payload((cmd + "\n").encode(), 1), verbose)
+		return out[0] if out else None
+
+	# all commands leave in a single write
+	def send_many(self, cmds, verbose: bool = False):
+		return self.send_prepared(prepare(cmds), verbose)
+
+	def send_prepared(self, payload, verbose: bool = False):
+		self._before(payload)
+		self._write(payload.data)
+		return self._after(payload.n, verbose)
+
+	# fresh statistics for another run over the same connection,
+	# replies still owed to the previous run are consumed first and the
+	# console leaves pipelined mode: each run chooses it again
+	def reset(self):
+		if self._pending is None:
+			self._skip()
+		else:
+			self.unpipeline()
+		self.errors = []
+		self.send_ns = Histogram()
+		self.gap_ns = Histogram()
+		self._last_write = None
+
+	def close(self):
+		self.drain(HANDSHAKE_TIMEOUT)
+		try:
+			self.sock.sendall(b"quit\n")
+		except OSError:
+			pass
+		self.sock.close()
+
+# the same commands written to several emulators at once.
+# every console gets the payload with a non blocking send, consoles whose
+# socket buffer is full are finished through a selector, so one slow
+# emulator does not hold back the writes to the others.
+class ConsoleGroup:
+	def __init__(self, consoles):
+		self.consoles = consoles
+		self._sel = selectors.DefaultSelector()
+		for c in consoles:
+			c.label = f"{c.port}: "
+
+	@property
+	def errors(self):
+		return [e for c in self.consoles for e in c.errors]
+
+	def pipeline(self, window=ACK_WINDOW, on_error=None):
+		for c in self.consoles:
+			c.pipeline(window, on_error)
+
+	def drain(self, timeout=None):
+		return all([c.drain(timeout) for c in self.consoles])
+
+	def _write(self, data):
+		t0 = time.monotonic_ns()
+		waiting = {}
+		for c in self.consoles:
+			try:
+				n = c.sock.send(data, socket.MSG_DONTWAIT)
+			except BlockingIOError:
+				n = 0
+			if n < len(data):
+				waiting[c.sock] = (c, memoryview(data)[n:])
+				self._sel.register(c.sock, selectors.EVENT_WRITE)
+			else:
+				c._written(t0, time.monotonic_ns())
+
+		while waiting:
+			for key, _ in self._sel.select():
+				c, rest = waiting[key.fileobj]
+				try:
+					n = c.sock.send(rest, socket.MSG_DONTWAIT)
+				except BlockingIOError:
+					continue
+				if n < len(rest):
+					waiting[key.fileobj] = (c, rest[n:])
+				else:
+					del waiting[key.fileobj]
+					self._sel.unregister(key.fileobj)
+					c._written(t0, time.monotonic_ns())
+
+	# replies from all targets, prefixed with the port when not OK
+	def _replies(self, outs):
+		if any(o is None for o in outs):
+			return None
+		merged = []
+		for i in range(len(outs[0])):
+			bad = [f"{c.port}: {o[i]}" for c, o in zip(self.consoles, outs) if o[i] != "OK"]
+			merged.append("\n".join(bad) if bad else "OK")
+		return merged
+
+	def send(self, cmd: str, verbose: bool = False):
+		out = self.send_many((cmd,), verbose)
+		return out[0] if out else None
+
+	def send_many(self, cmds, verbose: bool = False):
+		return self.send_prepared(prepare(cmds), verbose)
+
+	def send_prepared(self, payload, verbose: bool = False):
+		for c in self.consoles:
+			c._before(payload)
+		self._write(payload.data)
+		return self._replies([c._after(payload.n, verbose) for c in self.consoles])
+
+	def reset(self):
+		for c in self.consoles:
+			c.reset()
+
+	def close(self):
+		for c in self.consoles:
+			c.close()
+		self._sel.close()
+
+def printError(ts, cmd, reply):
+	print(f"{ts:.3f}> {cmd}\n{reply}", flush=True)
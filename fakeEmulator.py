@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# stand-in for the android emulator console, for running the injectors
+# without an emulator: same banner, auth and "sensor set" replies.
+# every accepted sensor command is timestamped and written to a trace on exit.
+
+import argparse
+import asyncio
+import csv
+import signal
+import socket
+import time
+
+SENSORS = {"acceleration", "gyroscope", "magnetic-field", "orientation", "temperature", "proximity", "light", "pressure", "humidity"}
+AUTH_REQUIRED = (
+	"Android Console: Authentication required\r\n"
+	"Android Console: type 'auth <auth_token>' to authenticate\r\n"
+	"Android Console: you can find your <auth_token> in \r\n"
+	"'{path}'\r\n"
+	"OK\r\n"
+)
+WELCOME = "Android Console: type 'help' for a list of commands\r\nOK\r\n"
+UNKNOWN = "KO: unknown command, try 'help'\r\n"
+
+parser = argparse.ArgumentParser(description="fake android emulator console")
+parser.add_argument("ports", type=int, nargs="*", default=[5554], help="console ports to listen on")
+parser.add_argument("--host", default="localhost")
+parser.add_argument("--auth", metavar="TOKEN", help="require 'auth TOKEN' before any other command")
+parser.add_argument("--delay", type=float, default=0.0, metavar="US", help="processing time of each command, blocks the console like the real one")
+parser.add_argument("--buffer", type=int, metavar="BYTES", help="socket receive buffer and read size, to simulate a slow consumer")
+parser.add_argument("--trace", metavar="PATH", help="received sensor commands as csv, or .npy for a binary array")
+
+class FakeConsole:
+	def __init__(self, token=None, delay_us=0.0, buffer=None):
+		self.token = token
+		self.delay = delay_us / 1000000
+		self.buffer = buffer
+		self.trace = [] # (recv_ns, port, sensor, x, y, z)
+		self.counts = {}
+
+	def reply(self, port, line, authed, recv_ns):
+		words = line.split()
+		if not words:
+			return "", authed
+		cmd = words[0]
+		if cmd == "auth":
+			if self.token is not None and words[1:] != [self.token]:
+				return "KO: authentication token does not match ~/.emulator_console_auth_token\r\n", authed
+			return WELCOME, True
+		if not authed:
+			return UNKNOWN, authed
+		if cmd == "help":
+			return "Android console commands:\r\n    sensor    manage emulator sensors\r\nOK\r\n", authed
+		if cmd != "sensor" or len(words) < 2:
+			return UNKNOWN, authed
+		if words[1] != "set" or len(words) != 4:
+			return "KO: bad sensors command\r\n", authed
+		if words[2] not in SENSORS:
+			return f"KO: unknown sensor name: {words[2]}, run 'sensor status' to get available sensors.\r\n", authed
+		try:
+			values = [float(v) for v in words[3].split(":")]
+		except ValueError:
+			return "KO: invalid sensor values\r\n", authed
+		values = (values + [0.0, 0.0, 0.0])[:3]
+		self.trace.append((recv_ns, port, words[2], *values))
+		self.counts[port] = self.counts.get(port, 0) + 1
+		if self.delay:
+			time.sleep(self.delay)
+		return "OK\r\n", authed
+
+	async def handle(self, port, reader, writer):
+		sock = writer.get_extra_info("socket")
+		if self.buffer:
+			sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.buffer)
+		authed = self.token is None
+		writer.write((AUTH_REQUIRED.format(path="~/.emulator_console_auth_token") if not authed else WELCOME).encode())
+
+		pending = b""
+		try:
+			while True:
+				chunk = await reader.read(self.buffer or 65536)
+				if not chunk:
+					break
+				recv_ns = time.monotonic_ns()
+				lines = (pending + chunk).split(b"\n")
+				pending = lines.pop()
+				out = []
+				for raw in lines:
+					line = raw.decode(errors="replace").strip()
+					if line in ("quit", "exit"):
+						writer.write("".join(out).encode())
+						await writer.drain()
+						return
+					text, authed = self.reply(port, line, authed, recv_ns)
+					out.append(text)
+				writer.write("".join(out).encode())
+				await writer.drain()
+		except ConnectionError:
+			pass
+		finally:
+			writer.close()
+
+	def writeTrace(self, path):
+		if path.endswith(".npy"):
+			import numpy as np
+			dtype = [("recv_ns", "i8"), ("port", "i4"), ("sensor", "U16"), ("x", "f8"), ("y", "f8"), ("z", "f8")]
+			np.save(path, np.array(self.trace, dtype=dtype))
+			return
+		with open(path, "w", newline="") as f:
+			writer = csv.writer(f)
+			writer.writerow(["recv_ns", "port", "sensor", "x", "y", "z"])
+			writer.writerows(self.trace)
+
+async def serve(console, host, ports):
+	servers = []
+	for port in ports:
+		servers.append(await asyncio.start_server(
+			lambda r, w, port=port: console.handle(port, r, w), host, port, reuse_address=True
+		))
+	print(f"listening on {host}:{','.join(map(str, ports))}", flush=True)
+
+	stop = asyncio.Event()
+	loop = asyncio.get_running_loop()
+	for sig in (signal.SIGINT, signal.SIGTERM):
+		loop.add_signal_handler(sig, stop.set)
+	await stop.wait()
+	for server in servers:
+		server.close()
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	console = FakeConsole(args.auth, args.delay, args.buffer)
+	asyncio.run(serve(console, args.host, args.ports))
+	for port in args.ports:
+		print(f"{port}: {console.counts.get(port, 0)} sensor commands")
+	if args.trace:
+		console.writeTrace(args.trace)
@@ -1,167 +1,248 @@
 #!/usr/bin/env python3
 
-import csv
-from androidEmulator import send
 import time
-import re
+STARTED = time.monotonic_ns()
+from androidEmulator import send, send_many, send_prepared, prepare, Payload, pipeline, finish, connect, addArguments, histograms, setDeadband, suppressed, SENSOR_NAMES
 import argparse
+from array import array
 from collections import deque
-from scipy.interpolate import CubicSpline
-import pandas as pd
+import numpy as np
+from recording import Recording
+import pacing
+import latency
+IMPORTED = time.monotonic_ns()
+
+# argparse type of the --window size
+def count(text):
+	n = int(text)
+	if n < 0:
+		raise argparse.ArgumentTypeError(f"{n} is negative")
+	return n
+
+# argparse type of --order: sensor names in the order given
+def sensorOrder(text):
+	names = [s.strip() for s in text.split(",")]
+	unknown = [s for s in names if s not in SENSOR_NAMES]
+	if unknown:
+		raise argparse.ArgumentTypeError(f"unknown sensor {','.join(unknown)}, expected some of {','.join(SENSOR_NAMES)}")
+	return [SENSOR_NAMES[s] for s in names]
 
 parser = argparse.ArgumentParser()
 parser.add_argument("-a", action="store_true", help="enable accelerometer")
 parser.add_argument("-g", action="store_true", help="enable gyroscope")
 parser.add_argument("-m", action="store_true", help="enable magnetic field")
 parser.add_argument("-r", type=int, default="1", help="number of repetitions of the csv file")
-parser.add_argument("-v", action="store_true", help="sensor set waits for answer from emulator")
+parser.add_argument("-v", action="store_true", help="check the answer from emulator for every sensor set")
+parser.add_argument("--window", type=count, default=32, help="with -v, commands awaiting an answer before sending blocks (0 waits for every answer)")
 parser.add_argument("csv_path", help="path to CSV file")
 parser.add_argument("--period", type=float, help="interpolation with precise period of milliseconds")
-args = parser.parse_args()
-
-ACC_ENABLED = args.a
-GYRO_ENABLED = args.g
-MAG_ENABLED = args.m
-
-if not (ACC_ENABLED or GYRO_ENABLED or MAG_ENABLED):
-	print("All sensors disabled")
-	exit(0)
-
-ACC_ALIASES = {"ax", "accelerometerx", "accelerationx"}, \
-			  {"ay", "accelerometery", "accelerationy"}, \
-			  {"az", "accelerometerz", "accelerationz"}
-GYR_ALIASES = {"gx", "gyroscopex", "rotationx"}, \
-			  {"gy", "gyroscopey", "rotationy"}, \
-			  {"gz", "gyroscopez", "rotationz"}
-MAG_ALIASES = {"mx", "magnetometerx"}, \
-			  {"my", "magnetometery"}, \
-			  {"mz", "magnetometerz"}
-
-# -------- csv header normalization --------
-def normalize(col):
-	return re.sub(r'[^a-z]', '', col.lower())
-
-def find_indices(headers, groups):
-	idx = []
-	for g in groups:
-		found = None
-		for i, h in enumerate(headers):
-			if normalize(h) in g:
-				found = i
-				break
-		idx.append(found)
-	return idx
-
-def exact(reader, ts_idx, acc_idx, gyr_idx, mag_idx):
-	print(f"using exact injection")
+parser.add_argument("--order", type=sensorOrder, default="acc,gyr,mag", help="order of the sensors written together each tick, e.g. mag,acc,gyr")
+addArguments(parser)
+pacing.addArguments(parser)
+latency.addArguments(parser)
+
+# whole recording parsed and formatted before the clock starts:
+# offsets in nanoseconds from the first row, the encoded commands of every
+# row back to back in one buffer, where each row ends and how many commands
+# it has. about the size of the csv itself.
+def loadSchedule(recording):
+	offsets = array("q")
+	data = bytearray()
+	ends = array("q")
+	counts = array("B")
 	t0_csv = None
-	t0_real = time.monotonic()
-	for row in reader:
-
-		target_csv = int(row[ts_idx])
-		if t0_csv == None:
-			t0_csv = target_csv
-		target_real = t0_real + (target_csv - t0_csv) / 1000.0
-		now_real = time.monotonic()
-		
-		if target_real > now_real:
-			time.sleep(target_real - now_real)
-		
-		#beforeInject = time.monotonic()
-		if ACC_ENABLED and all(row[i]!='' for i in acc_idx):
-			ax, ay, az = (row[i] for i in acc_idx)
-			send(f"sensor set acceleration {ax}:{ay}:{az}", verbose=args.v)
-
-		if GYRO_ENABLED and all(row[i]!='' for i in gyr_idx):
-			gx, gy, gz = (row[i] for i in gyr_idx)
-			send(f"sensor set gyroscope {gx}:{gy}:{gz}", verbose=args.v)
-
-		if MAG_ENABLED and all(row[i]!='' for i in mag_idx):
-			mx, my, mz = (row[i] for i in mag_idx)
-			send(f"sensor set magnetic-field {mx}:{my}:{mz}", verbose=args.v)
-		#afterInject = time.monotonic()
-		#print(f"injection took {(afterInject-beforeInject)*1000} milliseconds")
+	for chunk in recording.chunks():
+		sensors = []
+		for name, values, enabled in (
+			("acceleration", chunk.acc, ACC_ENABLED),
+			("gyroscope", chunk.gyr, GYRO_ENABLED),
+			("magnetic-field", chunk.mag, MAG_ENABLED),
+		):
+			if enabled:
+				complete = ~np.isnan(values).any(axis=1)
+				sensors.append((name, values.tolist(), complete.tolist()))
+		if t0_csv is None and len(chunk.timestamp):
+			t0_csv = int(chunk.timestamp[0])
+		for i, ts in enumerate(chunk.timestamp.tolist()):
+			cmds = [
+				f"sensor set {name} {v[i][0]}:{v[i][1]}:{v[i][2]}"
+				for name, v, complete in sensors
+				if complete[i]
+			]
+			if cmds:
+				offsets.append((ts - t0_csv) * 1000000)
+				data += prepare(cmds, ORDER).data
+				ends.append(len(data))
+				counts.append(len(cmds))
+	return offsets, data, ends, counts
+
+def exact(offsets, data, ends, counts):
+	print(f"using exact injection")
+	for i in pacer.schedule(offsets):
+		send_prepared(Payload(data[ends[i-1] if i else 0:ends[i]], counts[i]), verbose=args.v)
+
+# cubic hermite segment between the two middle samples of a 4 sample window,
+# tangents from the neighbouring samples (catmull-rom on uneven timestamps).
+# each new sample shifts the window and recomputes a single segment.
+class HermiteWindow:
+	def __init__(self):
+		self.t = deque(maxlen=4)
+		self.v = deque(maxlen=4)
+
+	def ready(self):
+		return len(self.t) == 4
+
+	def push(self, t, xyz):
+		self.t.append(t)
+		self.v.append(xyz)
+		if len(self.t) < 4:
+			return
+		t0, t1, t2, t3 = self.t
+		p0, p1, p2, p3 = self.v
+		h = t2 - t1
+		self.start = t1
+		self.span = h
+		self.coeffs = []
+		for i in range(3):
+			# tangents scaled to the unit parameter of the segment
+			m1 = (p2[i] - p0[i]) / (t2 - t0) * h
+			m2 = (p3[i] - p1[i]) / (t3 - t1) * h
+			self.coeffs.append((
+				2*(p1[i] - p2[i]) + m1 + m2,
+				3*(p2[i] - p1[i]) - 2*m1 - m2,
+				m1,
+				p1[i],
+			))
+
+	def value(self, t):
+		u = (t - self.start) / self.span
+		u = 0.0 if u < 0.0 else 1.0 if u > 1.0 else u
+		return tuple(((a*u + b)*u + c)*u + d for a, b, c, d in self.coeffs)
 
 #precondition: csv file has enough rows for the sliding window.
-def interpolation(reader, ts_idx, acc_idx):
-	print(f"using cubic spline interpolation (only acceleration)")
-	tsWindow = deque(maxlen=4) #queue of timestamps in millis csv
-	accWindow = deque(maxlen=4) #queue of xyz tuples
-
-	startId = 1
-	slideId = 2
-	while len(tsWindow) < 4:
-		row = next(reader)
-		ts = int(row[ts_idx])
-		acc = list(row[i] for i in acc_idx)
-		tsWindow.append(ts)
-		accWindow.append(acc)
-	
-	def slide(reader):
-		try:
-			row = next(
-				row for row in reader
-				if all(row[i] is not None for i in acc_idx)
-			)
-		except StopIteration:
-			#print("no more rows")
+def interpolation(recording):
+	print(f"using cubic hermite interpolation")
+	rows = recording.rows()
+	windows = [
+		(name, pos, HermiteWindow())
+		for name, pos, enabled in (
+			("acceleration", 0, ACC_ENABLED),
+			("gyroscope", 1, GYRO_ENABLED),
+			("magnetic-field", 2, MAG_ENABLED),
+		) if enabled
+	]
+
+	if not windows:
+		return
+
+	# csv timestamps in millis, window times in nanoseconds since the first row.
+	# every sensor keeps its own queue of samples read ahead and its window
+	# slides only when the time passes its own samples, so a sensor recorded
+	# at a lower rate does not push the others past the current time
+	t0_csv = None
+	ahead = [deque() for _ in windows]
+	def readRow():
+		nonlocal t0_csv
+		row = next(rows, None)
+		if row is None:
 			return False
-		tsWindow.append(int(row[ts_idx]))
-		accWindow.append(list(row[i] for i in acc_idx))
+		ts, sensors = row[0], row[1:]
+		if t0_csv is None:
+			t0_csv = ts
+		for (name, pos, window), queue in zip(windows, ahead):
+			if sensors[pos] is not None:
+				queue.append(((ts - t0_csv) * 1000000, sensors[pos]))
 		return True
-	
-	#csv timestamps translated into real time
-	t0 = time.time() # in seconds real
-	csv_delta = t0 - tsWindow[startId]/1000.0 # difference between real time and csv time, in seconds
-	def convert(csv_timestamp):
-		return csv_timestamp/1000000.0 + csv_delta # convert csv timestamp in microseconds to real time in seconds
-
-	def interpolator(timeWindow, valuesWindow):
-		timestamps = list(convert(ts) for ts in timeWindow)
-		values = list(valuesWindow)
-		# Cublic spline calculated from values in real time seconds
-		return CubicSpline(timestamps, values)
-
-	acc_spline = interpolator(tsWindow, accWindow)
-	csvHasNext = True
-	while csvHasNext:
-		now = time.time()
-
-		while now > convert(tsWindow[slideId]) and csvHasNext:
-			csvHasNext = slide(reader)
-			acc_spline = interpolator(tsWindow, accWindow)
 
-		if ACC_ENABLED:
-			[ax, ay, az] = acc_spline(now)
-			send(f"sensor set acceleration {ax}:{ay}:{az}", verbose=args.v)
+	def slide(k):
+		while not ahead[k]:
+			if not readRow():
+				return False
+		windows[k][2].push(*ahead[k].popleft())
+		return True
 
-		time.sleep(args.period/1000000.0)
+	for k, (_, _, window) in enumerate(windows):
+		while not window.ready():
+			if not slide(k):
+				return
 
-with open(args.csv_path, newline="") as f:
-	reader = csv.reader(f)
-	headers = next(reader)
-	while headers[0].startswith("#"):
-		headers = next(reader)
-	
-	ts_idx = next(
-		i for i, h in enumerate(headers)
-		if normalize(h) == "timestamp"
-	)
-	acc_idx = find_indices(headers, ACC_ALIASES)
-	gyr_idx = find_indices(headers, GYR_ALIASES)
-	mag_idx = find_indices(headers, MAG_ALIASES)
+	# real time starts at the csv time where every window has a segment
+	start = max(window.start for _, _, window in windows)
+	csvHasNext = True
+	for _, offset in pacer.periodic(args.period * 1000000):
+		now = offset + start
+
+		for k, (_, _, window) in enumerate(windows):
+			while csvHasNext and now > window.t[2]:
+				csvHasNext = slide(k)
+
+		cmds = []
+		for name, pos, window in windows:
+			x, y, z = window.value(now)
+			cmds.append(f"sensor set {name} {x}:{y}:{z}")
+		send_many(cmds, verbose=args.v, order=ORDER)
+
+		if not csvHasNext:
+			break
+
+# returns the run statistics, also used by injectDaemon.py.
+# started is the process start, for reporting the import time
+def main(argv=None, started=None):
+	global args, pacer, ORDER, ACC_ENABLED, GYRO_ENABLED, MAG_ENABLED
+	marks = [("", started or time.monotonic_ns())]
+	if started:
+		marks.append(("import", IMPORTED))
+	args = parser.parse_args(argv)
+	ACC_ENABLED = args.a
+	GYRO_ENABLED = args.g
+	MAG_ENABLED = args.m
+
+	if not (ACC_ENABLED or GYRO_ENABLED or MAG_ENABLED):
+		print("All sensors disabled")
+		return None
+
+	ORDER = args.order
+
+	pacer = pacing.fromArgs(args)
+	connect(args.emulator)
+	marks.append(("connect", time.monotonic_ns()))
+	setDeadband(args.deadband, args.keepalive)
+	if args.v and args.window > 0:
+		pipeline(args.window)
+
+	recording = Recording(args.csv_path)
+	acc_idx, gyr_idx, mag_idx = recording.acc_idx, recording.gyr_idx, recording.mag_idx
 	ACC_ENABLED = False if any(i is None for i in acc_idx) else ACC_ENABLED
 	GYRO_ENABLED = False if any(i is None for i in gyr_idx) else GYRO_ENABLED
 	MAG_ENABLED = False if any(i is None for i in mag_idx) else MAG_ENABLED
-	print(f"csv format: ts={ts_idx} acc={acc_idx} gyro={gyr_idx} mag={mag_idx}")
-	
+	print(f"csv format: ts={recording.ts_idx} acc={acc_idx} gyro={gyr_idx} mag={mag_idx}")
+
+	# repetitions of exact injection reuse the schedule in memory,
+	# interpolation streams the file again through the memory map
+	if not args.period:
+		schedule = loadSchedule(recording)
+	marks.append(("load", time.monotonic_ns()))
+	startup = latency.phases(marks)
+
 	for i in range(int(args.r)):
 		if args.period:
-			interpolation(reader, ts_idx, acc_idx, gyr_idx, mag_idx)
+			interpolation(recording)
 		else:
-			exact(reader, ts_idx, acc_idx, gyr_idx, mag_idx)
-		
+			exact(*schedule)
+	
 		if(int(args.r) > 1):
 			print(f"injection completed {i+1}/{args.r}")
-			f.seek(0)
-			next(reader)
\ No newline at end of file
+	recording.close()
+
+	if args.v:
+		errors = finish()
+		if errors: print(f"{errors} commands rejected by the emulator")
+
+	print(f"pacing: {pacer.summary()}")
+	if args.deadband is not None:
+		print(f"deadband: {suppressed()} commands suppressed")
+	stats = latency.report({**histograms(), "lateness": pacer.lateness}, args.stats)
+	return {"pacing": pacer.summary(), "suppressed": suppressed(), "startup_ms": startup, "latency": stats}
+
+if __name__ == "__main__":
+	main(started=STARTED)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# long lived injector for test campaigns: python, numpy/scipy, the console
+# connection and the fitted models stay loaded between runs.
+# one json request per line on a unix socket, runs are served one at a time:
+#   {"run": "inject", "args": ["-a", "walk.csv"]}
+#   {"run": "interp", "args": ["walk.csv", "50", "cubic"]}
+#   {"run": "mock", "args": ["Normal", "100", "Game"], "cwd": "/path/with/send"}
+#   {"run": "ping"} / {"run": "quit"}
+# args are the command line of the script, -e defaults to the daemon ports.
+# every reply is one json line:
+#   {"ok": true, "seconds": 10.02, "stats": {...}, "output": "..."}
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import time
+import androidEmulator
+
+SOCKET_PATH = "/tmp/sensorinjection.sock"
+RUNS = ("inject", "interp", "mock")
+
+parser = argparse.ArgumentParser(description="persistent injection daemon")
+parser.add_argument("--socket", default=SOCKET_PATH, help="path of the control socket")
+parser.add_argument("-e", "--emulator", type=int, nargs="+", default=[androidEmulator.EMULATOR_PORT], metavar="PORT", help="console ports used when a request has no -e")
+
+# client side, used by testInjection.py
+def request(run, argv=(), path=SOCKET_PATH, cwd=None):
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+		s.connect(path)
+		msg = {"run": run, "args": list(argv), "cwd": cwd or os.getcwd()}
+		s.sendall((json.dumps(msg) + "\n").encode())
+		with s.makefile("r") as f:
+			line = f.readline()
+	if not line:
+		raise ConnectionError(f"injection daemon on {path} closed the connection")
+	return json.loads(line)
+
+class Handler(socketserver.StreamRequestHandler):
+	def handle(self):
+		for line in self.rfile:
+			try:
+				msg = json.loads(line)
+			except ValueError as e:
+				msg = {}
+				reply = {"ok": False, "error": f"bad request: {e}"}
+			else:
+				reply = self.server.execute(msg)
+			self.wfile.write((json.dumps(reply) + "\n").encode())
+			self.wfile.flush()
+			if msg.get("run") == "quit":
+				return
+
+class Daemon(socketserver.UnixStreamServer):
+	def __init__(self, path, ports):
+		import inject, interp, mock
+		self.mains = {"inject": inject.main, "interp": interp.main, "mock": mock.main}
+		self.ports = ports
+		self.stopped = False
+		if os.path.exists(path):
+			os.remove(path)
+		super().__init__(path, Handler)
+		try:
+			androidEmulator.connect(ports)
+		except (androidEmulator.ConsoleError, OSError) as e:
+			print(f"console not reachable yet ({e}), connecting on the first run")
+
+	def execute(self, msg):
+		run = msg.get("run")
+		if run == "ping":
+			return {"ok": True}
+		if run == "quit":
+			self.stopped = True
+			return {"ok": True}
+		if run not in RUNS:
+			return {"ok": False, "error": f"unknown run {run!r}, expected one of {RUNS}"}
+
+		argv = [str(a) for a in msg.get("args", [])]
+		if "-e" not in argv and "--emulator" not in argv:
+			argv += ["-e"] + [str(p) for p in self.ports]
+		home = os.getcwd()
+		out = io.StringIO()
+		reply = {"ok": True}
+		start = time.monotonic_ns()
+		try:
+			os.chdir(msg.get("cwd") or home)
+			with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+				reply["stats"] = self.mains[run](argv)
+		except SystemExit as e: # argparse errors and the scripts' own exits
+			if e.code not in (None, 0):
+				reply = {"ok": False, "error": f"{run} exited with {e.code}"}
+		except (androidEmulator.ConsoleError, ConnectionError, socket.timeout) as e:
+			# the console went away, the next run starts from a fresh connection.
+			# other errors (e.g. a missing csv) keep the connection
+			androidEmulator.disconnect()
+			reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+		except Exception as e:
+			reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+		finally:
+			os.chdir(home)
+		reply["seconds"] = (time.monotonic_ns() - start) / 1e9
+		reply["output"] = out.getvalue()
+		print(f"{run} {' '.join(argv)}: {'ok' if reply['ok'] else reply['error']} in {reply['seconds']:.2f}s", flush=True)
+		return reply
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+	daemon = Daemon(args.socket, args.emulator)
+	print(f"listening on {args.socket}", flush=True)
+	try:
+		while not daemon.stopped:
+			daemon.handle_request()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		daemon.server_close()
+		os.remove(args.socket)
+		androidEmulator.disconnect()
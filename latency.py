@@ -0,0 +1,91 @@
+import csv
+import json
+from array import array
+
+SUB_BITS = 5 # 16 buckets per power of two: values are kept within ~6%
+BUCKETS = (64 - SUB_BITS + 1) << (SUB_BITS - 1)
+PERCENTILES = (50.0, 99.0, 99.9)
+
+def bucketOf(ns):
+	if ns < (1 << SUB_BITS):
+		return ns
+	e = ns.bit_length() - SUB_BITS
+	return (e << (SUB_BITS - 1)) + (ns >> e)
+
+# lowest value that falls in bucket i
+def bucketStart(i):
+	if i < (1 << SUB_BITS):
+		return i
+	e = (i >> (SUB_BITS - 1)) - 1
+	return (i - (e << (SUB_BITS - 1))) << e
+
+# log-bucketed histogram of nanosecond durations.
+# counts live in a preallocated array, so recording is a couple of
+# integer operations and cheap enough to stay on for every injection.
+class Histogram:
+	def __init__(self):
+		self.counts = array("q", bytes(8 * BUCKETS))
+		self.count = 0
+		self.total = 0
+		self.max = 0
+
+	def record(self, ns):
+		if ns < 0:
+			ns = 0
+		self.counts[bucketOf(ns)] += 1
+		self.count += 1
+		self.total += ns
+		if ns > self.max:
+			self.max = ns
+
+	def percentile(self, p):
+		if self.count == 0:
+			return 0
+		rank = p / 100.0 * self.count
+		seen = 0
+		for i, n in enumerate(self.counts):
+			seen += n
+			if n and seen >= rank:
+				# middle of the bucket, never above the exact maximum
+				return min((bucketStart(i) + bucketStart(i + 1)) // 2, self.max)
+		return self.max
+
+	def summary(self):
+		s = {"count": self.count, "mean_us": self.total / self.count / 1000 if self.count else 0.0}
+		for p in PERCENTILES:
+			s[f"p{p:g}_us"] = self.percentile(p) / 1000
+		s["max_us"] = self.max / 1000
+		return s
+
+	def __str__(self):
+		s = self.summary()
+		return f"n={s['count']} " + " ".join(f"{k[:-3]}={v:.1f}us" for k, v in s.items() if k != "count")
+
+# print every histogram and write their summaries to path (.json or csv),
+# the summaries are returned as well
+def report(histograms, path=None):
+	for name, h in histograms.items():
+		print(f"{name}: {h}")
+	summaries = {name: h.summary() for name, h in histograms.items()}
+	if not path:
+		return summaries
+	with open(path, "w", newline="") as f:
+		if path.endswith(".json"):
+			json.dump(summaries, f, indent=1)
+			return summaries
+		writer = csv.writer(f)
+		fields = ["count", "mean_us"] + [f"p{p:g}_us" for p in PERCENTILES] + ["max_us"]
+		writer.writerow(["name"] + fields)
+		for name, s in summaries.items():
+			writer.writerow([name] + [s[k] for k in fields])
+	return summaries
+
+# milliseconds between consecutive (name, monotonic_ns) marks, printed on one line,
+# e.g. the startup phases of an injector before its first command
+def phases(marks, label="startup"):
+	ms = {name: (t - prev) / 1000000 for (_, prev), (name, t) in zip(marks, marks[1:])}
+	print(f"{label}: " + ", ".join(f"{name} {v:.1f} ms" for name, v in ms.items()) + f", total {sum(ms.values()):.1f} ms")
+	return ms
+
+def addArguments(parser):
+	parser.add_argument("--stats", metavar="PATH", help="write send time, lateness and gap percentiles (.json or csv)")
@@ -1,65 +1,129 @@
 #!/usr/bin/env python3
 
-import argparse
 import time
+STARTED = time.monotonic_ns()
+import argparse
 import csv
+import numpy as np
 from sensormodel import getModel
-from androidEmulator import send
+from androidEmulator import send, connect, addArguments, histograms, setDeadband, suppressed
+import pacing
+import latency
+from sendLog import SendLog
 import glob
+import math
 import os
+IMPORTED = time.monotonic_ns()
 
 parser = argparse.ArgumentParser()
 parser.add_argument("magnitude", choices=("Lower", "Normal", "Higher"))
 parser.add_argument("frequency", type=int, help="injection frequency in hertz")
 parser.add_argument("delay", choices=("Game", "Fastest"), help="android sensor delay (used only for csv logging)")
-args = parser.parse_args()
+parser.add_argument("--precompute", action="store_true", help="evaluate the model and format every command before injecting")
+parser.add_argument("--log-format", default="csv", choices=("csv", "npy"), help="send log as csv or binary numpy array")
+addArguments(parser)
+pacing.addArguments(parser)
+latency.addArguments(parser)
 
 S2NS = 1000000000
-model = getModel(args.magnitude)
-if(args.frequency == 0): period = None
-else: period = S2NS / args.frequency
-
-print(f"period (ns): {period}")
-
-WRITE_LOGS = False if period is None else True
-
-files = glob.glob(f"./send/{args.magnitude}_{args.frequency}_{args.delay}_send_*.csv")
-iteration = len(files)
-logFile = f"./send/{args.magnitude}_{args.frequency}_{args.delay}_send_{iteration}.csv"
-print("writing to ", logFile)
-
-if os.path.exists(logFile):
-	print("error in iteration numbers, exiting")
-	exit(1)
-
-t0 = time.monotonic_ns()
-now = t0
-end = t0 + 10*S2NS
-count = 0
-
-with open(logFile, "w", newline="") as f:
-	writer = csv.writer(f)
-	writer.writerow(["timestamp", "ax", "ay", "az", "nano"])
-
-	while end > now:
-		now = time.monotonic_ns()
-		[ax, ay, az] = model.value((now-t0)/S2NS)
-		send(f"sensor set acceleration {ax}:{ay}:{az}", verbose=False)
-		if(WRITE_LOGS):
-			# timestamps always in millis since epoch
-			# nano added for precision
+DURATION = 10*S2NS
+
+# returns the run statistics, also used by injectDaemon.py.
+# started is the process start, for reporting the import time
+def main(argv=None, started=None):
+	marks = [("", started or time.monotonic_ns())]
+	if started:
+		marks.append(("import", IMPORTED))
+	args = parser.parse_args(argv)
+	model = getModel(args.magnitude)
+	if(args.frequency == 0): period = None
+	else: period = S2NS / args.frequency
+
+	print(f"period (ns): {period}")
+
+	# with a fixed period every injection time is known in advance:
+	# one vectorized model call covers the whole run and the loop only paces and sends.
+	# at max speed the times depend on the loop itself, so the model stays live.
+	schedule = None
+	if args.precompute:
+		if period is None:
+			print("precompute needs a frequency, evaluating live")
+		else:
+			offsets = np.arange(math.ceil(DURATION/period)) * period
+			values = model.value(offsets/S2NS).tolist()
+			offsets = offsets.astype(np.int64).tolist()
+			schedule = [
+				(ax, ay, az, f"sensor set acceleration {ax}:{ay}:{az}")
+				for ax, ay, az in values
+			]
+
+	WRITE_LOGS = False if period is None else True
+
+	ext = "csv" if not WRITE_LOGS else args.log_format
+	files = glob.glob(f"./send/{args.magnitude}_{args.frequency}_{args.delay}_send_*.{ext}")
+	iteration = len(files)
+	logFile = f"./send/{args.magnitude}_{args.frequency}_{args.delay}_send_{iteration}.{ext}"
+	print("writing to ", logFile)
+
+	if os.path.exists(logFile):
+		print("error in iteration numbers, exiting")
+		exit(1)
+
+	marks.append(("load", time.monotonic_ns()))
+	connect(args.emulator)
+	marks.append(("connect", time.monotonic_ns()))
+	setDeadband(args.deadband, args.keepalive)
+
+	pacer = pacing.fromArgs(args)
+	count = 0
+
+	# records stay in memory until the run is over
+	if WRITE_LOGS:
+		log = SendLog(logFile, len(offsets) if schedule is not None else math.ceil(DURATION/period) + 1, args.log_format)
+	marks.append(("log", time.monotonic_ns()))
+	startup = latency.phases(marks)
+
+	if schedule is not None:
+		# logged nano is the scheduled offset the values were computed for
+		for i in pacer.schedule(offsets):
+			ax, ay, az, cmd = schedule[i]
+			send(cmd, verbose=False)
 			timestamp = int(time.time()*1000.0)
-			writer.writerow([timestamp, ax, ay, az, now-t0])
-		count += 1
-
-		now = time.monotonic_ns()
-		if(period != None ):
-			target = t0 + count*period
-			if now < target:
-				time.sleep((target-now)/S2NS)
+			log.append(timestamp, ax, ay, az, offsets[i])
+			count += 1
+	else:
+		values = model.stream()
+		next(values)
+		last = 0
+		for _ in pacer.periodic(period, DURATION):
+			now = time.monotonic_ns() - pacer.t0
+			[ax, ay, az] = values.send((now-last)/S2NS)
+			last = now
+			send(f"sensor set acceleration {ax}:{ay}:{az}", verbose=False)
+			if(WRITE_LOGS):
+				# timestamps always in millis since epoch
+				# nano added for precision
+				timestamp = int(time.time()*1000.0)
+				log.append(timestamp, ax, ay, az, now)
+			count += 1
+
+	if WRITE_LOGS:
+		log.close()
+	else:
+		with open(logFile, "w", newline="") as f:
+			writer = csv.writer(f)
+			writer.writerow(["timestamp", "ax", "ay", "az", "nano"])
+			writer.writerow([count])
+
 	if not WRITE_LOGS:
-		writer.writerow([count])
+		print("total number of injections: ", count)
+		print(f"estimated frequency: {count/10.0} Hz")
+
+	print(f"pacing: {pacer.summary()}")
+	if args.deadband is not None:
+		print(f"deadband: {suppressed()} commands suppressed")
+	stats = latency.report({**histograms(), "lateness": pacer.lateness}, args.stats)
+	return {"pacing": pacer.summary(), "suppressed": suppressed(), "count": count, "log": logFile, "startup_ms": startup, "latency": stats}
 
-if not WRITE_LOGS:
-	print("total number of injections: ", count)
-	print(f"estimated frequency: {count/10.0} Hz")
\ No newline at end of file
+if __name__ == "__main__":
+	main(started=STARTED)
@@ -0,0 +1,99 @@
+import time
+from latency import Histogram
+
+S2NS = 1000000000
+SPIN_NS = 200000 # last stretch before a deadline spent polling the clock instead of sleeping
+
+# deadline scheduler shared by the injectors.
+# time.sleep() wakes up 50-100us late or more, so it is only used until
+# spin_ns before the deadline and the rest is a busy wait on the clock.
+# when behind schedule the policy decides what happens to late ticks:
+#   "catchup" sends every late tick back to back until on time again
+#   "drop"    skips a tick whenever the next one is already due
+class Pacer:
+	def __init__(self, spin_ns=SPIN_NS, policy="catchup"):
+		if policy not in ("catchup", "drop"):
+			raise ValueError(f"unknown pacing policy {policy}")
+		self.spin_ns = spin_ns
+		self.policy = policy
+		self.t0 = None
+		self.ticks = 0
+		self.missed = 0 # deadlines already passed when the loop got to them
+		self.dropped = 0
+		self.lateness = Histogram()
+
+	def start(self, t0=None):
+		self.t0 = time.monotonic_ns() if t0 is None else t0
+		return self.t0
+
+	# absolute deadline in monotonic nanoseconds, returns how late it was reached
+	def wait(self, deadline):
+		self.ticks += 1
+		now = time.monotonic_ns()
+		if now >= deadline:
+			if now > deadline:
+				self.missed += 1
+		else:
+			if deadline - now > self.spin_ns:
+				time.sleep((deadline - now - self.spin_ns) / S2NS)
+			now = time.monotonic_ns()
+			while now < deadline:
+				now = time.monotonic_ns()
+		self.lateness.record(now - deadline)
+		return now - deadline
+
+	# yields the index of each offset (ns from start) once it is due
+	def schedule(self, offsets):
+		t0 = self.start()
+		n = len(offsets)
+		i = 0
+		while i < n:
+			self.wait(t0 + offsets[i])
+			if self.policy == "drop":
+				now = time.monotonic_ns()
+				j = i
+				while j + 1 < n and t0 + offsets[j+1] <= now:
+					j += 1
+				self.dropped += j - i
+				self.ticks += j - i
+				i = j
+			yield i
+			i += 1
+
+	# yields (index, offset) of ticks every period_ns until duration_ns.
+	# without a period the ticks run back to back and offset is the elapsed time.
+	def periodic(self, period_ns, duration_ns=None):
+		t0 = self.start()
+		i = 0
+		while True:
+			if period_ns is None:
+				offset = time.monotonic_ns() - t0
+			else:
+				offset = round(i * period_ns)
+			if duration_ns is not None and offset >= duration_ns:
+				return
+			if period_ns is None:
+				self.ticks += 1
+			else:
+				self.wait(t0 + offset)
+				if self.policy == "drop":
+					due = int((time.monotonic_ns() - t0) // period_ns)
+					if due > i:
+						if duration_ns is not None:
+							due = min(due, int(-(-duration_ns // period_ns)) - 1)
+						self.dropped += due - i
+						self.ticks += due - i
+						i = due
+						offset = round(i * period_ns)
+			yield i, offset
+			i += 1
+
+	def summary(self):
+		return f"{self.ticks} ticks, {self.missed} missed deadlines, {self.dropped} dropped"
+
+def addArguments(parser):
+	parser.add_argument("--spin", type=int, default=SPIN_NS // 1000, metavar="US", help="microseconds before each deadline spent busy waiting")
+	parser.add_argument("--policy", default="catchup", choices=("catchup", "drop"), help="late ticks are sent back to back or dropped")
+
+def fromArgs(args):
+	return Pacer(args.spin * 1000, args.policy)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+# progress of the testInjection.py campaigns in sqlite.
+# every result is committed in its own transaction together with the
+# per test count, so a killed run loses at most the test in progress and
+# "already done" is a primary key lookup instead of a scan of the csv.
+# the csv files keep their layout: they are imported once into an empty
+# store and can be written back from it at any time.
+
+import argparse
+import csv
+import heapq
+import os
+import sqlite3
+import threading
+
+LIVE_HEADER = ["file", "mode", "sampling", "algorithm", "steps"]
+STATIC_HEADER = ["file", "a", "a_interp"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS live (
+	id INTEGER PRIMARY KEY,
+	file TEXT NOT NULL,
+	mode TEXT NOT NULL,
+	sampling TEXT NOT NULL,
+	algorithm TEXT NOT NULL,
+	steps INTEGER NOT NULL,
+	finished REAL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+);
+CREATE TABLE IF NOT EXISTS live_count (
+	file TEXT NOT NULL,
+	mode TEXT NOT NULL,
+	sampling TEXT NOT NULL,
+	algorithm TEXT NOT NULL,
+	n INTEGER NOT NULL,
+	PRIMARY KEY (file, mode, sampling, algorithm)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS static (
+	file TEXT PRIMARY KEY,
+	a INTEGER NOT NULL,
+	a_interp INTEGER NOT NULL,
+	finished REAL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+);
+CREATE TABLE IF NOT EXISTS timing (
+	id INTEGER PRIMARY KEY,
+	kind TEXT NOT NULL, -- live, static or mock
+	file TEXT NOT NULL,
+	mode TEXT NOT NULL,
+	phase TEXT NOT NULL, -- navigation, injection, read, reset, ...
+	seconds REAL NOT NULL,
+	recording REAL NOT NULL -- length of the injected recording in seconds
+);
+CREATE INDEX IF NOT EXISTS timing_kind ON timing (kind, phase);
+"""
+
+# expected seconds of one test: measured overheads plus the recording,
+# or `default` before anything has been measured
+def testSeconds(means, recording, default):
+	if not means:
+		return default
+	return sum(means.values()) + (recording if "injection" in means else 0.0)
+
+# time for the workers to run every cost when they are handed out
+# longest first, each to the worker that is free earliest
+def makespan(costs, workers=1):
+	loads = [0.0] * max(1, workers)
+	for cost in sorted(costs, reverse=True):
+		heapq.heappush(loads, heapq.heappop(loads) + cost)
+	return max(loads)
+
+# the files to run (file -> seconds of its remaining tests) in a time window:
+# as many complete files as fit, picked shortest first, then ordered
+# longest first so the workers finish close together.
+# returns the order and its expected duration.
+def plan(costs, window=None, workers=1):
+	chosen = []
+	for file, cost in sorted(costs.items(), key=lambda fc: fc[1]):
+		if window is not None and makespan([costs[f] for f in chosen] + [cost], workers) > window:
+			break
+		chosen.append(file)
+	chosen.sort(key=lambda f: costs[f], reverse=True)
+	return chosen, makespan([costs[f] for f in chosen], workers) if chosen else 0.0
+
+parser = argparse.ArgumentParser(description="progress store of the test campaigns")
+parser.add_argument("db", help="sqlite progress store")
+parser.add_argument("action", choices=("import", "export", "status"))
+parser.add_argument("table", choices=("live", "static"))
+parser.add_argument("csv", nargs="?", help="results csv to import or export")
+
+class ProgressStore:
+	def __init__(self, path):
+		self.path = path
+		# shared by the worker threads of testInjection.py, one at a time
+		self.lock = threading.Lock()
+		self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self.db.execute("PRAGMA journal_mode=WAL")
+		self.db.execute("PRAGMA synchronous=FULL")
+		self.db.executescript(SCHEMA)
+
+	def _transaction(self, statements):
+		with self.lock:
+			self.db.execute("BEGIN IMMEDIATE")
+			try:
+				for sql, params in statements:
+					self.db.execute(sql, params)
+			except BaseException:
+				self.db.execute("ROLLBACK")
+				raise
+			self.db.execute("COMMIT")
+
+	# -------- live --------
+
+	def _live(self, file, mode, sampling, algorithm, steps):
+		key = (file, mode, sampling, algorithm)
+		return [
+			("INSERT INTO live (file, mode, sampling, algorithm, steps) VALUES (?, ?, ?, ?, ?)", key + (int(steps),)),
+			("INSERT INTO live_count VALUES (?, ?, ?, ?, 1) ON CONFLICT (file, mode, sampling, algorithm) DO UPDATE SET n = n + 1", key),
+		]
+
+	def addLive(self, file, mode, sampling, algorithm, steps, phases=None, recording=0.0):
+		self._transaction(self._live(file, mode, sampling, algorithm, steps) + self._timing("live", file, mode, phases, recording))
+
+	def liveCount(self, file, mode, sampling, algorithm):
+		with self.lock:
+			row = self.db.execute(
+				"SELECT n FROM live_count WHERE file = ? AND mode = ? AND sampling = ? AND algorithm = ?",
+				(file, mode, sampling, algorithm)
+			).fetchone()
+		return row[0] if row else 0
+
+	# (file, mode, sampling, algorithm) -> completed tests
+	def liveCounts(self):
+		with self.lock:
+			rows = self.db.execute("SELECT file, mode, sampling, algorithm, n FROM live_count").fetchall()
+		return {row[:4]: row[4] for row in rows}
+
+	# -------- static --------
+
+	# mode tells apart the ways of importing the recordings in the timing table
+	def addStatic(self, file, a, a_interp, phases=None, recording=0.0, mode=""):
+		self._transaction(
+			[("INSERT OR REPLACE INTO static (file, a, a_interp) VALUES (?, ?, ?)", (file, int(a), int(a_interp)))]
+			+ self._timing("static", file, mode, phases, recording)
+		)
+
+	def verified(self):
+		with self.lock:
+			return {row[0] for row in self.db.execute("SELECT file FROM static")}
+
+	# -------- timing --------
+
+	def _timing(self, kind, file, mode, phases, recording):
+		return [
+			("INSERT INTO timing (kind, file, mode, phase, seconds, recording) VALUES (?, ?, ?, ?, ?, ?)", (kind, file, mode, phase, seconds, recording))
+			for phase, seconds in (phases or {}).items()
+		]
+
+	# wall time of each phase of a test that has no result of its own (mock)
+	def addTiming(self, kind, file, mode, phases, recording=0.0):
+		self._transaction(self._timing(kind, file, mode, phases, recording))
+
+	# mean seconds of every phase of a kind of test, of one mode only when
+	# given. the injection phase is reported as its overhead beyond the
+	# length of the injected recording.
+	def phaseMeans(self, kind, mode=None):
+		with self.lock:
+			rows = self.db.execute(
+				"SELECT phase, AVG(seconds - CASE WHEN phase = 'injection' THEN recording ELSE 0 END)"
+				" FROM timing WHERE kind = ? AND (? IS NULL OR mode = ?) GROUP BY phase",
+				(kind, mode, mode)
+			).fetchall()
+		return dict(rows)
+
+	# -------- csv --------
+
+	def empty(self, table):
+		with self.lock:
+			return self.db.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {table})").fetchone()[0]
+
+	# rows of an existing results csv, only into a table that is still empty
+	# so importing again never counts a test twice. returns the rows imported.
+	def importCsv(self, table, path):
+		if not os.path.exists(path) or not self.empty(table):
+			return 0
+		statements = []
+		with open(path, newline="") as f:
+			for row in csv.reader(f):
+				if len(row) < 2 or not row[-1].lstrip("-").isdigit(): # header or a torn last row
+					continue
+				if table == "live" and len(row) == len(LIVE_HEADER):
+					statements += self._live(*row)
+				elif table == "static" and len(row) == len(STATIC_HEADER) and row[1].lstrip("-").isdigit():
+					statements.append(("INSERT OR REPLACE INTO static (file, a, a_interp) VALUES (?, ?, ?)", (row[0], int(row[1]), int(row[2]))))
+		self._transaction(statements)
+		return len(statements) // 2 if table == "live" else len(statements)
+
+	# the table in its csv layout, replacing path atomically
+	def exportCsv(self, table, path):
+		header = LIVE_HEADER if table == "live" else STATIC_HEADER
+		with self.lock:
+			rows = self.db.execute(f"SELECT {', '.join(header)} FROM {table} ORDER BY rowid").fetchall()
+		tmp = f"{path}.{os.getpid()}.tmp"
+		with open(tmp, "w", newline="") as f:
+			writer = csv.writer(f)
+			writer.writerow(header)
+			writer.writerows(rows)
+		os.replace(tmp, path)
+		return len(rows)
+
+	def close(self):
+		self.db.close()
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+
+	store = ProgressStore(args.db)
+	if args.action == "import":
+		print(f"{store.importCsv(args.table, args.csv)} rows imported")
+	elif args.action == "export":
+		print(f"{store.exportCsv(args.table, args.csv)} rows exported")
+	elif args.table == "live":
+		counts = store.liveCounts()
+		print(f"{sum(counts.values())} live tests over {len(counts)} configurations")
+	else:
+		print(f"{len(store.verified())} files verified")
+	store.close()
@@ -0,0 +1,136 @@
+import mmap
+import re
+from collections import namedtuple
+import numpy as np
+
+CHUNK_BYTES = 4 << 20 # parsed at a time, bounds memory whatever the file size
+
+ACC_ALIASES = {"ax", "accelerometerx", "accelerationx"}, \
+			  {"ay", "accelerometery", "accelerationy"}, \
+			  {"az", "accelerometerz", "accelerationz"}
+GYR_ALIASES = {"gx", "gyroscopex", "rotationx"}, \
+			  {"gy", "gyroscopey", "rotationy"}, \
+			  {"gz", "gyroscopez", "rotationz"}
+MAG_ALIASES = {"mx", "magnetometerx"}, \
+			  {"my", "magnetometery"}, \
+			  {"mz", "magnetometerz"}
+
+# -------- csv header normalization --------
+def normalize(col):
+	return re.sub(r'[^a-z]', '', col.lower())
+
+def find_indices(headers, groups):
+	idx = []
+	for g in groups:
+		found = None
+		for i, h in enumerate(headers):
+			if normalize(h) in g:
+				found = i
+				break
+		idx.append(found)
+	return idx
+
+# rows of one chunk: int64 timestamps and (n,3) float64 axes,
+# NaN where the row has empty fields, None when the csv lacks the sensor
+Chunk = namedtuple("Chunk", "timestamp acc gyr mag")
+
+# split a block of complete lines into an (n, ncols) array of byte strings
+def splitFields(block, ncols):
+	lines = [l for l in block.replace(b"\r", b"").split(b"\n") if l and not l.startswith(b"#")]
+	if all(l.count(b",") == ncols - 1 for l in lines):
+		fields = b",".join(lines).split(b",")
+	else:
+		# ragged rows: pad or cut each one to the header width
+		fields = [f for l in lines for f in (l.split(b",") + [b""] * ncols)[:ncols]]
+	return np.array(fields, dtype=bytes).reshape(-1, ncols)
+
+def toNumbers(col, dtype=np.float64):
+	if dtype == np.int64:
+		try:
+			return col.astype(np.int64)
+		except ValueError:
+			return toNumbers(col).astype(np.int64)
+	return np.where(col == b"", b"nan", col).astype(dtype)
+
+# csv recording read through a memory map, a chunk of lines at a time.
+# the header is the first line not starting with '#', sensor columns are
+# found through the same aliases inject.py always used.
+class Recording:
+	def __init__(self, path, chunk_bytes=CHUNK_BYTES):
+		self.path = path
+		self.chunk_bytes = chunk_bytes
+		with open(path, "rb") as f:
+			try:
+				self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError: # empty file
+				self._map = b""
+
+		pos = 0
+		line = b""
+		while pos < len(self._map):
+			end = self._map.find(b"\n", pos)
+			end = len(self._map) if end < 0 else end
+			line = self._map[pos:end].rstrip(b"\r")
+			pos = end + 1
+			if not line.startswith(b"#"):
+				break
+		self.data_start = pos
+		self.headers = line.decode().split(",")
+		self.ts_idx = next((i for i, h in enumerate(self.headers) if normalize(h) == "timestamp"), None)
+		self.acc_idx = find_indices(self.headers, ACC_ALIASES)
+		self.gyr_idx = find_indices(self.headers, GYR_ALIASES)
+		self.mag_idx = find_indices(self.headers, MAG_ALIASES)
+
+	def _blocks(self):
+		pos = self.data_start
+		n = len(self._map)
+		while pos < n:
+			end = min(pos + self.chunk_bytes, n)
+			if end < n:
+				nl = self._map.find(b"\n", end)
+				end = n if nl < 0 else nl + 1
+			yield self._map[pos:end]
+			pos = end
+
+	def _sensor(self, table, idx):
+		if any(i is None for i in idx):
+			return None
+		return np.column_stack([toNumbers(table[:, i]) for i in idx])
+
+	def chunks(self):
+		if self.ts_idx is None:
+			raise ValueError(f"{self.path}: no timestamp column in {self.headers}")
+		for block in self._blocks():
+			table = splitFields(block, len(self.headers))
+			yield Chunk(
+				toNumbers(table[:, self.ts_idx], np.int64),
+				self._sensor(table, self.acc_idx),
+				self._sensor(table, self.gyr_idx),
+				self._sensor(table, self.mag_idx),
+			)
+
+	# one (timestamp, acc, gyr, mag) per row, sensors None when missing or empty
+	def rows(self):
+		for chunk in self.chunks():
+			sensors = []
+			for values in (chunk.acc, chunk.gyr, chunk.mag):
+				if values is None:
+					sensors.append([None] * len(chunk.timestamp))
+				else:
+					complete = ~np.isnan(values).any(axis=1)
+					sensors.append([v if ok else None for v, ok in zip(values.tolist(), complete.tolist())])
+			yield from zip(chunk.timestamp.tolist(), *sensors)
+
+	# positional columns as float64, in chunks or all at once
+	def columns(self, usecols):
+		for block in self._blocks():
+			table = splitFields(block, len(self.headers))
+			yield np.column_stack([toNumbers(table[:, i]) for i in usecols])
+
+	def load(self, usecols):
+		blocks = list(self.columns(usecols))
+		return np.concatenate(blocks) if blocks else np.empty((0, len(usecols)))
+
+	def close(self):
+		if isinstance(self._map, mmap.mmap):
+			self._map.close()
@@ -0,0 +1,66 @@
+import queue
+import threading
+import numpy as np
+
+HEADER = ["timestamp", "ax", "ay", "az", "nano"]
+RECORD = np.dtype([("timestamp", "i8"), ("ax", "f8"), ("ay", "f8"), ("az", "f8"), ("nano", "i8")])
+
+# injection log records kept in preallocated arrays during the run.
+# a full buffer is handed to a writer thread and replaced by a spare one,
+# so formatting and file writes never happen in the paced loop.
+# csv output is byte for byte what csv.writer produced for the same rows,
+# npy output is a structured array with the same columns.
+class SendLog:
+	def __init__(self, path, capacity=4096, fmt="csv"):
+		self.path = path
+		self.fmt = fmt
+		self.capacity = max(1, capacity)
+		self.count = 0
+		self._buf = np.empty(self.capacity, dtype=RECORD)
+		self._spare = queue.Queue()
+		self._full = queue.Queue()
+		self._chunks = [] # npy keeps everything until close
+		self._file = open(path, "w" if fmt == "csv" else "wb", newline="" if fmt == "csv" else None)
+		if fmt == "csv":
+			self._file.write(",".join(HEADER) + "\r\n")
+		self._writer = threading.Thread(target=self._drain, daemon=True)
+		self._writer.start()
+
+	def append(self, timestamp, ax, ay, az, nano):
+		i = self.count % self.capacity
+		self._buf[i] = (timestamp, ax, ay, az, nano)
+		self.count += 1
+		if i == self.capacity - 1:
+			self._full.put(self._buf)
+			try:
+				self._buf = self._spare.get_nowait()
+			except queue.Empty:
+				self._buf = np.empty(self.capacity, dtype=RECORD)
+
+	def _drain(self):
+		while True:
+			chunk = self._full.get()
+			if chunk is None:
+				return
+			self._write(chunk)
+			if len(chunk) == self.capacity:
+				self._spare.put(chunk)
+
+	def _write(self, chunk):
+		if self.fmt != "csv":
+			self._chunks.append(chunk.copy())
+			return
+		self._file.write("".join(
+			f"{ts},{ax!r},{ay!r},{az!r},{nano}\r\n"
+			for ts, ax, ay, az, nano in chunk.tolist()
+		))
+
+	def close(self):
+		rest = self.count % self.capacity
+		if rest:
+			self._full.put(self._buf[:rest])
+		self._full.put(None)
+		self._writer.join()
+		if self.fmt != "csv":
+			np.save(self._file, np.concatenate(self._chunks) if self._chunks else np.empty(0, dtype=RECORD))
+		self._file.close()
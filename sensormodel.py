@@ -1,6 +1,8 @@
+import math
 import numpy as np
 
 G = 9.80665  # m/s^2
+TOLERANCE = 1e-9 # difference between stream() and value() accepted by the check below
 
 class AccelerometerModel:
 	def __init__(self, n_waves=5, seed=2, magnitude=(3.0, -2.0, 2.0)):
@@ -24,6 +26,50 @@ class AccelerometerModel:
 		acc[..., 2] += G
 		return acc
 
+	# same values as value(), one sample at a time without numpy.
+	# with a fixed dt sample i is at t0 + i*dt, otherwise the step is taken
+	# from send(), e.g. gen.send(seconds_since_previous_sample).
+	# every sample is evaluated directly at its absolute time: in python one
+	# math.sin per component is cheaper than rotating a (sin, cos) phasor,
+	# and nothing accumulates between samples.
+	def stream(self, dt=None, t0=0.0):
+		omegas = [2 * math.pi * float(f) for f in self.freqs for _ in range(3)]
+		phases = self.phases.ravel().tolist()
+		amps = self.amps.ravel().tolist()
+		m = len(amps)
+
+		t = t0
+		i = 0
+		while True:
+			ax = ay = 0.0
+			az = G
+			for j in range(0, m, 3):
+				ax += amps[j] * math.sin(omegas[j] * t + phases[j])
+				ay += amps[j+1] * math.sin(omegas[j+1] * t + phases[j+1])
+				az += amps[j+2] * math.sin(omegas[j+2] * t + phases[j+2])
+
+			step = yield (ax, ay, az)
+
+			i += 1
+			if dt is None:
+				t += step or 0.0
+			else:
+				t = t0 + i * dt
+
+# largest difference between stream() and value() over `samples` samples,
+# with a fixed dt or, when jitter is given, steps drawn around it
+def driftCheck(model, samples, dt, jitter=None, seed=0):
+	if jitter is None:
+		gen = model.stream(dt)
+		got = [next(gen) for _ in range(samples)]
+		t = np.arange(samples) * dt
+	else:
+		steps = np.random.default_rng(seed).uniform(dt - jitter, dt + jitter, samples - 1)
+		gen = model.stream()
+		got = [next(gen)] + [gen.send(step) for step in steps.tolist()]
+		t = np.concatenate(([0.0], np.cumsum(steps)))
+	return float(np.abs(np.array(got) - model.value(t)).max())
+
 def getModel(magnitude: str):
 	if (magnitude=="Lower"):
 		return AccelerometerModel(magnitude=(2.5,-2.0,2.0))
@@ -32,4 +78,16 @@ def getModel(magnitude: str):
 	if (magnitude=="Higher"):
 		return AccelerometerModel(magnitude=(10.0, -6.0, 6.0))
 	else:
-		raise ValueError("unknown magnitude")
\ No newline at end of file
+		raise ValueError("unknown magnitude")
+
+# python sensormodel.py [samples]: streamed values against value() over a long run
+if __name__ == "__main__":
+	import sys
+	samples = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+	worst = 0.0
+	for magnitude in ("Lower", "Normal", "Higher"):
+		for dt, jitter in ((0.001, None), (0.02, None), (0.001, 0.0005)):
+			err = driftCheck(getModel(magnitude), samples, dt, jitter)
+			worst = max(worst, err)
+			print(f"{magnitude:6} dt={dt} jitter={jitter}: max error {err:.3g}")
+	sys.exit(0 if worst < TOLERANCE else 1)
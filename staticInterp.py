@@ -1,34 +1,72 @@
+#!/usr/bin/env python3
+
 import os
 import glob
-import csv
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from utils import InterpolationModel
 
 FREQ = 50
 S2NS = 1000000000
-PERIOD = S2NS // FREQ
 
-files = sorted(glob.glob("fulldata/*.csv"))
+parser = argparse.ArgumentParser(description="resample recorded walks at a fixed frequency")
+parser.add_argument("files", nargs="*", default=["fulldata/*.csv"], help="csv files or glob patterns")
+parser.add_argument("-o", "--out", default="interp/", help="output directory")
+parser.add_argument("-f", "--frequency", type=int, default=FREQ, help="resampling frequency in hertz")
+parser.add_argument("-k", "--kind", default="cubic", choices=("cubic", "pchip"), help="interpolation model")
+parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+parser.add_argument("--format", default="csv", choices=("csv", "npy"), help="csv or binary (timestamp, ax, ay, az, nano) float64 array")
+parser.add_argument("--force", action="store_true", help="regenerate outputs newer than their input")
 
-for file in files:
+def outputPath(file, outdir, fmt):
+    name = "i_" + os.path.basename(file)
+    if fmt == "npy":
+        name = os.path.splitext(name)[0] + ".npy"
+    return os.path.join(outdir, name)
 
-    print("Processing:", file)
+def isFresh(file, outfile):
+    return os.path.exists(outfile) and os.path.getmtime(outfile) >= os.path.getmtime(file)
 
-    model = InterpolationModel(file, kind="cubic")
+# whole time grid evaluated at once, output written with a single call
+def resample(file, outfile, period, kind, fmt):
+    model = InterpolationModel(file, kind=kind)
 
     duration = model.duration_ns()
-    t_values = np.arange(0, duration, PERIOD)
+    t_values = np.arange(0, duration, period)
+    values = model.values_ns(t_values)
 
-    outname = "i_" + os.path.basename(file)
-    outfile = os.path.join("interp/", outname)
+    if fmt == "npy":
+        np.save(outfile, np.column_stack([np.floor(t_values / 1e6), values, t_values]))
+        return len(t_values)
 
+    # same text csv.writer produced row by row: repr of floats, \r\n endings
+    rows = "".join(
+        f"{int(t / 1e6)},{ax!r},{ay!r},{az!r},{t!r}\r\n"
+        for t, (ax, ay, az) in zip(t_values.tolist(), values.tolist())
+    )
     with open(outfile, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "ax", "ay", "az", "nano"])
+        f.write("timestamp,ax,ay,az,nano\r\n" + rows)
+    return len(t_values)
 
-        for t in t_values:
-            ax, ay, az = model.value_ns(t)
+if __name__ == "__main__":
+    args = parser.parse_args()
+    period = S2NS // args.frequency
 
-            timestamp = int(t / 1e6)
+    files = sorted({f for pattern in args.files for f in glob.glob(pattern)})
+    os.makedirs(args.out, exist_ok=True)
+    jobs = []
+    for file in files:
+        outfile = outputPath(file, args.out, args.format)
+        if not args.force and isFresh(file, outfile):
+            continue
+        jobs.append((file, outfile))
+    print(f"{len(jobs)} to resample, {len(files) - len(jobs)} up to date")
 
-            writer.writerow([timestamp, ax, ay, az, t])
\ No newline at end of file
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [
+            (file, pool.submit(resample, file, outfile, period, args.kind, args.format))
+            for file, outfile in jobs
+        ]
+        for file, future in futures:
+            print(f"{file}: {future.result()} rows")
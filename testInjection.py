@@ -9,23 +9,38 @@ from selenium.webdriver.support.ui import WebDriverWait # type: ignore
 from selenium.webdriver.support import expected_conditions as EC # type: ignore
 from selenium.common.exceptions import TimeoutException # type: ignore
 import argparse
+import base64
 import csv
 import os
 from collections import defaultdict
 import time
 import glob
+import queue
+import re
+import threading
+from injectDaemon import request, SOCKET_PATH
+from progress import ProgressStore, testSeconds, plan
 
 parser = argparse.ArgumentParser()
 parser.add_argument("app", choices=("steplab_live", "steplab_static", "sensorcsv"), help="which app to test")
+parser.add_argument("--daemon", nargs="?", const=SOCKET_PATH, metavar="SOCKET", help="inject through a running injectDaemon.py instead of a new process per test (with --emulators, one daemon per emulator at SOCKET.PORT)")
+parser.add_argument("--emulators", type=int, nargs="+", metavar="PORT", help="run the tests in parallel, one worker per emulator console port")
+parser.add_argument("--window", type=float, metavar="HOURS", help="only run the files whose remaining tests fit in this many hours")
+parser.add_argument("--push", action="store_true", help="steplab_static: push the recordings to the emulator and import them from there instead of Google Drive")
 #parser.add_argument("csvFiles", nargs="*", help="path to real recordings of walks")
 args = parser.parse_args()
 
 appiumServerURL = 'http://localhost:4723'
-driver = None
+SYSTEM_PORT = 8200 # uiautomator2 port of the first worker, one more per worker
 appium_proc = None
 dirPath = "/home/zbarba/uni/tesi/"
 walksPath = dirPath + "fulldata/*"
-interpPath = dirPath + "interp/*"
+interpDir = dirPath + "interp/"
+interpPath = interpDir + "*"
+
+# results of every campaign, the csv files below are kept in sync with it
+PROGRESS_DB = dirPath+"progress.sqlite"
+store = None
 
 # StepLab live
 INTERP_ALGS = [] #"cubic", "pchip"
@@ -35,20 +50,84 @@ SAMPLINGS = ["50"] #, "max" # capped at 50 for interpolations at 50hz
 ALGORITHMS = [("Peak","Butterworth")] # MAE 6-7 (Forlani)
 # ("Intersection", "LowPass+2%") # MAE 30
 REPETITIONS = 3
+LIVE_SECONDS = 38 # per test, until durations have been measured
 OUTPUT_LIVE = dirPath+"pedometerExactInterp.csv"
 alreadyTested = defaultdict(int)
 # StepLab static
 OUTPUT_STATIC = dirPath+"verificationResults.csv"
 alreadyVerified = set()
+STATIC_SECONDS = 90
+PUSH_SECONDS = 20 # per file with --push
+# --push copies the recordings here, one folder per dataset like on Drive
+PUSH_DIR = "/sdcard/Download/steplab/"
 
 # SensorCSV
 MAGNITUDES = ["Lower", "Normal", "Higher"]
 FREQUENCIES = ["50", "100", "200", "500", "1000", "0"]
 DELAYS = ["Game", "Fastest"]
 ITERATIONS = 20
+MOCK_SECONDS = 10 # length of every mock.py injection
 
 # -------- Automation --------
 
+# the appium session of the calling thread: every worker drives its own
+# emulator, the functions below keep using the module level `driver`
+class ThreadDriver(threading.local):
+	session = None
+	port = None # console port of the emulator, None for the default one
+	index = 0
+	tests = 0
+
+	def __getattr__(self, name):
+		return getattr(self.session, name)
+
+	def __setattr__(self, name, value):
+		if name in ("session", "port", "index", "tests"):
+			super().__setattr__(name, value)
+		else:
+			setattr(self.session, name, value)
+
+driver = ThreadDriver()
+outputLock = threading.Lock()
+
+# prefix of the progress lines of a worker
+def tag():
+	return f"[{driver.port}] " if driver.port else ""
+
+# wall time of the phases of one test, mark(name) closes the phase
+# running since the previous mark
+class Phases(dict):
+	def __init__(self):
+		super().__init__()
+		self.last = time.monotonic()
+
+	def mark(self, name):
+		now = time.monotonic()
+		self[name] = self.get(name, 0.0) + now - self.last
+		self.last = now
+
+# length in seconds of a recording, from its first and last timestamp (ms)
+def recordingSeconds(path):
+	with open(path, "rb") as f:
+		header = f.readline()
+		while header.startswith(b"#"):
+			header = f.readline()
+		first = f.readline()
+		f.seek(max(0, os.path.getsize(path) - 4096))
+		last = f.read().strip().splitlines()[-1]
+	names = header.decode().strip().split(",")
+	ts = next((i for i, h in enumerate(names) if re.sub(r'[^a-z]', '', h.lower()) == "timestamp"), 0)
+	try:
+		return (int(last.split(b",")[ts]) - int(first.split(b",")[ts])) / 1000
+	except (ValueError, IndexError):
+		return 0.0
+
+def printEstimate(seconds):
+	seconds = int(seconds)
+	hours = seconds // 3600
+	mins = (seconds % 3600) // 60
+	print(f"Estimated time: {hours}h {mins}m")
+
 def start_appium():
 	print("Starting Appium server... ", end="", flush=True)
 	proc = subprocess.Popen(
@@ -69,7 +148,6 @@ def start_appium():
 	exit(1)
 
 def createDriver():
-	global driver
 	if(args.app.startswith("steplab")):
 		apk = dirPath+"repo/steplab.apk"
 		package = "com.example.steplab"
@@ -90,91 +168,195 @@ def createDriver():
 	options.auto_grant_permissions = True
 	options.language = "en"
 	options.locale = "US"
+	if driver.port:
+		options.udid = f"emulator-{driver.port}"
+		options.system_port = SYSTEM_PORT + driver.index
 
-	driver = webdriver.Remote(appiumServerURL, options=options)
+	driver.session = webdriver.Remote(appiumServerURL, options=options)
 	driver.orientation = "PORTRAIT"
 
 	print("Done")
 
 def resetDriver():
-	global driver
-	print("Driver Reset")
+	print(f"{tag()}Driver Reset")
 	try:
 		driver.quit()
 	finally:
 		createDriver()
 
+# jobs run one after the other on the current session, or with --emulators
+# pulled from a shared queue by one worker thread per emulator.
+# setup runs once per session, after it is created.
+def runJobs(jobs, work, setup=None):
+	if not args.emulators:
+		if setup: setup()
+		for job in jobs:
+			work(job)
+		return
+
+	pending = queue.Queue()
+	for job in jobs:
+		pending.put(job)
+	failed = []
+
+	def worker(index, port):
+		driver.index = index
+		driver.port = port
+		try:
+			createDriver()
+			if setup: setup()
+			while True:
+				try:
+					job = pending.get_nowait()
+				except queue.Empty:
+					break
+				work(job)
+		except BaseException as e: # quitAll exits the worker thread only
+			print(f"{tag()}worker stopped: {e!r}")
+			failed.append(port)
+		finally:
+			if driver.session:
+				try:
+					driver.quit()
+				except Exception:
+					pass
+				driver.session = None
+
+	workers = [threading.Thread(target=worker, args=(i, port)) for i, port in enumerate(args.emulators)]
+	for w in workers:
+		w.start()
+	for w in workers:
+		w.join()
+	if failed:
+		print(f"workers on {failed} stopped, {pending.qsize()} tests not run")
+		quitAll(1)
+
+# one result, committed to the progress store before the csv row is
+# appended, so an interrupted campaign never counts a half written test
+def record(f, writer, table, row, phases=None, recording=0.0):
+	with outputLock:
+		if table == "live":
+			store.addLive(*row, phases=phases, recording=recording)
+		else:
+			store.addStatic(*row, phases=phases, recording=recording, mode=staticMode())
+		writer.writerow(row)
+		f.flush()
+
 def quitAll(val=0):
+	if threading.current_thread() is not threading.main_thread():
+		exit(val) # a worker stops alone, runJobs reports it
+	printUiTimes()
 	if val==0:
 		print(" -- Testing completed --")
-		driver.quit()
+		if driver.session:
+			driver.quit()
 	else:
 		print(" -- Terminated with Error --")
 	appium_proc.terminate()
 	exit(val)
 
-def clickId(id, scroll):
-	if scroll:
-		driver.find_element(
-			AppiumBy.ANDROID_UIAUTOMATOR,
-			'new UiScrollable(new UiSelector().scrollable(true))'
-			f'.scrollIntoView(new UiSelector().resourceId("com.example.steplab:id/{id}"))'
-		)
-	driver.find_element(AppiumBy.ID, f"com.example.steplab:id/{id}").click()
-
-def clickText(text, scroll):
-	if scroll:
-		driver.find_element(
-			AppiumBy.ANDROID_UIAUTOMATOR,
-			'new UiScrollable(new UiSelector().scrollable(true))'
-			f'.scrollIntoView(new UiSelector().textContains("{text}"))'
-		)
-	driver.find_element(AppiumBy.ANDROID_UIAUTOMATOR, f'new UiSelector().textContains("{text}")').click()
-
-def clickIcon(icon, scroll):
-	if scroll:
-		driver.find_element(
-			AppiumBy.ANDROID_UIAUTOMATOR,
-			'new UiScrollable(new UiSelector().scrollable(true))'
-			f'.scrollIntoView(new UiSelector().description({icon}))'
-		)
-	driver.find_element(AppiumBy.ACCESSIBILITY_ID, f"{icon}").click()
+# ui steps poll their condition instead of sleeping a fixed time
+POLL = 0.1 # seconds between two checks of a waited condition
+CLICK_TIMEOUT = 5.0
+STEPS_SETTLE = 0.5 # a step count unchanged this long after it changed is final
+STEPS_FIRST = 5.0 # the count first shown may be a placeholder 0, it is final only after this long
+
+# time spent in every kind of ui step, printed when testing ends
+uiTimes = defaultdict(lambda: [0, 0.0])
+uiLock = threading.Lock()
+
+def uiStep(name, start):
+	with uiLock:
+		entry = uiTimes[name]
+		entry[0] += 1
+		entry[1] += time.monotonic() - start
+
+def printUiTimes():
+	if not uiTimes:
+		return
+	print("ui time per step:")
+	for name, (n, total) in sorted(uiTimes.items(), key=lambda item: -item[1][1]):
+		print(f"  {name:<40} {n:6d}x {total/n:6.2f}s  total {total/60:7.1f}m")
+
+# locator of a target and the UiSelector used to scroll to it
+def locator(text=None, id=None, icon=None):
+	if id is not None:
+		return (AppiumBy.ID, f"com.example.steplab:id/{id}"), f'resourceId("com.example.steplab:id/{id}")'
+	if text is not None:
+		return (AppiumBy.ANDROID_UIAUTOMATOR, f'new UiSelector().textContains("{text}")'), f'textContains("{text}")'
+	return (AppiumBy.ACCESSIBILITY_ID, f"{icon}"), f'description("{icon}")'
+
+# targets that had to be scrolled into view the last time they were clicked:
+# those scroll right away, the others are first looked up on screen
+needsScroll = {}
+
+def scrollTo(selector):
+	driver.find_element(
+		AppiumBy.ANDROID_UIAUTOMATOR,
+		'new UiScrollable(new UiSelector().scrollable(true))'
+		f'.scrollIntoView(new UiSelector().{selector})'
+	)
+
+# the target element, scrolled into view only when it is not on screen
+def findTarget(loc, selector, scroll):
+	if not (scroll and needsScroll.get(loc)):
+		# find_elements returns at once when nothing matches
+		found = driver.find_elements(*loc)
+		if found:
+			return found[0]
+		if not scroll:
+			return None
+	try:
+		scrollTo(selector)
+		element = driver.find_element(*loc)
+	except Exception:
+		needsScroll.pop(loc, None) # look on screen first next time
+		raise
+	needsScroll[loc] = True
+	return element
 
 def click(text=None, id=None, icon=None, scroll = True):
-	# try clicking 5 times
-	for i in range(5):
+	loc, selector = locator(text, id, icon)
+	start = time.monotonic()
+	tries = 0
+	# keep trying until CLICK_TIMEOUT
+	while True:
 		try:
-			if id is not None:
-				clickId(id, scroll)
-			elif text is not None:
-				clickText(text, scroll)
-			elif icon is not None:
-				clickIcon(icon, scroll)
-			return
-		except Exception as e:
-			if i>1:
-				print("Struggling to find element")
-			if not scroll:
-				time.sleep(1.0)
+			element = findTarget(loc, selector, scroll)
+			if element is not None:
+				element.click()
+				uiStep(f"click {id or text or icon}", start)
+				return
+		except Exception:
+			pass
+		tries += 1
+		if tries == 10:
+			print("Struggling to find element")
+		if time.monotonic() - start > CLICK_TIMEOUT:
+			break
+		time.sleep(POLL)
 	print(f"Error: Text {text} or id {id} not found")
 	quitAll(1)
 
 def waitUntil(text=None, id=None, icon=None):
+	start = time.monotonic()
 	try:
-		if text is not None:
-			WebDriverWait(driver, 30).until( EC.presence_of_element_located(
-				(AppiumBy.ANDROID_UIAUTOMATOR, f'new UiSelector().textContains("{text}")')
-			))
-		elif id is not None:
-			WebDriverWait(driver, 30).until( EC.presence_of_element_located(
-				(AppiumBy.ID, f"com.example.steplab:id/{id}")
-			))
-		elif icon is not None:
-			WebDriverWait(driver, 30).until( EC.presence_of_element_located(
-				(AppiumBy.ACCESSIBILITY_ID, f"{icon}")
-			))
+		WebDriverWait(driver, 30, poll_frequency=POLL).until(
+			EC.presence_of_element_located(locator(text, id, icon)[0])
+		)
 	except TimeoutException:
 		print(f"wait timeout for text={text} id={id}")
+	uiStep(f"wait {id or text or icon}", start)
+
+# a condition polled every POLL seconds, returns its last value
+def waitFor(name, condition, timeout=30):
+	start = time.monotonic()
+	try:
+		return WebDriverWait(driver, timeout, poll_frequency=POLL).until(lambda _: condition())
+	except TimeoutException:
+		print(f"wait timeout for {name}")
+	finally:
+		uiStep(f"wait {name}", start)
 
 def read(id):
 	try:
@@ -228,15 +410,30 @@ def startForlaniLive(algorithm="Peak", filter="Butterworth", sampling = "max"):
 
 	click(id = "start_pedometer")
 
+# console port of the worker's emulator for the injectors
+def emulatorArgs():
+	return ["-e", str(driver.port)] if driver.port else []
+
+# the run of an injector script inside the daemon, failures raise like check=True
+def daemonRun(script, argv):
+	path = f"{args.daemon}.{driver.port}" if driver.port else args.daemon
+	reply = request(script, argv + emulatorArgs(), path=path)
+	if not reply["ok"]:
+		raise RuntimeError(f"{reply['error']}\n{reply.get('output', '')}")
+	return reply
+
 def exactInjection(path):
 	try:
-		subprocess.run(
-			[dirPath+"repo/inject.py", "-a", path],
-			stdout=subprocess.DEVNULL,
-			stderr=subprocess.PIPE,
-			text=True,
-			check=True
-		)
+		if args.daemon:
+			daemonRun("inject", ["-a", path])
+		else:
+			subprocess.run(
+				[dirPath+"repo/inject.py", "-a", path] + emulatorArgs(),
+				stdout=subprocess.DEVNULL,
+				stderr=subprocess.PIPE,
+				text=True,
+				check=True
+			)
 	except Exception as e:
 		print(f"Error from inject.py: {e}")
 		print(f"{dirPath}repo/inject.py -a {path}")
@@ -244,18 +441,37 @@ def exactInjection(path):
 
 def interpInjection(path, frequency, model="cubic"):
 	try:
-		subprocess.run(
-			[dirPath+"repo/interp.py", path, f"{frequency}", model],
-			stdout=subprocess.DEVNULL,
-			stderr=subprocess.PIPE,
-			text=True,
-			check=True
-		)
+		if args.daemon:
+			daemonRun("interp", [path, f"{frequency}", model])
+		else:
+			subprocess.run(
+				[dirPath+"repo/interp.py", path, f"{frequency}", model] + emulatorArgs(),
+				stdout=subprocess.DEVNULL,
+				stderr=subprocess.PIPE,
+				text=True,
+				check=True
+			)
 	except Exception as e:
 		print(f"Error from interp.py: {e}")
 		print(f"{dirPath}repo/interp.py {path} {frequency} {model}")
 		quitAll(1)
 
+def liveJobs(paths):
+	for path in paths:
+		#if "1759165821155_IRREGULAR_STEPS_POCKET_22_MALE_samsung_SM-G770F.csv" in path:
+		#	continue
+		for mode in INTERPS:
+			# injection frequency
+			for sampling in SAMPLINGS:
+
+				if("50" in mode and sampling == "max"):
+					continue
+
+				for alg, filt in ALGORITHMS:
+					start = alreadyTested[(os.path.basename(path), mode, sampling, f"{alg}+{filt}")]
+					for i in range(start, REPETITIONS):
+						yield path, mode, sampling, alg, filt, i
+
 def liveTests(paths):
 
 	wasCreated = not os.path.exists(OUTPUT_LIVE)
@@ -264,34 +480,27 @@ def liveTests(paths):
 		if wasCreated:
 			writer.writerow(["file", "mode", "sampling", "algorithm", "steps"])
 
-		for path in paths:
-			#if "1759165821155_IRREGULAR_STEPS_POCKET_22_MALE_samsung_SM-G770F.csv" in path:
-			#	continue
-			print(f"file: {os.path.basename(path)}")
-			for mode in INTERPS:
-				# injection frequency
-				for sampling in SAMPLINGS:
-
-					if("50" in mode and sampling == "max"):
-						continue
-
-					print(f"-mode: {mode} -> {sampling} sampling")
-					for alg, filt in ALGORITHMS:
-						print(f"- -algorithm: {alg}+{filt}")
+		def liveTest(job):
+			path, mode, sampling, alg, filt, i = job
+			phases = Phases()
+			startForlaniLive(alg, filt, sampling)
+			phases.mark("navigation")
 
-						start = alreadyTested[(os.path.basename(path), mode, sampling, f"{alg}+{filt}")]
-						for i in range(start, REPETITIONS):
-							startForlaniLive(alg, filt, sampling)
+			if mode == "exact":
+				exactInjection(path)
+			else:
+				interpInjection(path, mode.split("-")[1], model="cubic" if "cubic" in mode else "pchip")
+			phases.mark("injection")
 
-							if mode == "exact":
-								exactInjection(path)
-							else:
-								interpInjection(path, mode.split("-")[1], model="cubic" if "cubic" in mode else "pchip")
+			steps = read("step_count")
+			phases.mark("read")
+			
+			record(f, writer, "live", [os.path.basename(path), mode, sampling, f"{alg}+{filt}", int(steps)], phases, recordingSeconds(path))
+			print(f"{tag()}{os.path.basename(path)} {mode} -> {sampling} sampling, {alg}+{filt} #{i+1}: {steps} steps ({sum(phases.values()):.0f}s)")
 
-							steps = read("step_count")
-							
-							writer.writerow([os.path.basename(path), mode, sampling, f"{alg}+{filt}", int(steps)])
-							print(f"   | {steps} steps")
+		runJobs(liveJobs(paths), liveTest)
+	# rewritten from the store, drops any row torn by an earlier crash
+	store.exportCsv("live", OUTPUT_LIVE)
 
 # --------- StepLab Static Testing --------
 
@@ -311,17 +520,64 @@ def importFromDrive(file):
 	# hardcoded way to make this function reliable
 	# search for a unique substring but click on a longer substring
 	searchName = file[:15] if file.startswith("17") or file.startswith("i_17") else file[:-4]
-	visibleName = file[:20] if file.startswith("17") or file.startswith("i_17") else file
 
 	waitUntil(icon="Search")
 	click(icon="Search", scroll=False)
 	driver.switch_to.active_element.send_keys(searchName)
 
-	waitUntil(visibleName)
-	click(text=visibleName)
+	waitUntil(visibleName(file))
+	click(text=visibleName(file))
 	waitUntil("Import Complete")
 	click("Ok", scroll = False)
 
+# how the recordings reach the app, kept with the timings of the tests.
+# drive imports are stored without a mode, as before --push existed
+def staticMode():
+	return "push" if args.push else ""
+
+# long names are cut in the picker
+def visibleName(file):
+	return file[:20] if file.startswith("17") or file.startswith("i_17") else file
+
+def pushFolder(file):
+	return "interp" if file.startswith("i_") else "walks"
+
+# every walk and its interpolation copied to the emulator storage in one
+# go before the tests, so the picker only opens local files.
+# the files stay on the device when the session is reset.
+def pushRecordings(paths):
+	start = time.monotonic()
+	size = 0
+	for path in paths:
+		file = os.path.basename(path)
+		for local, name in ((path, file), (interpDir + "i_" + file, "i_" + file)):
+			with open(local, "rb") as f:
+				data = f.read()
+			driver.push_file(f"{PUSH_DIR}{pushFolder(name)}/{name}", base64.b64encode(data).decode())
+			size += len(data)
+	print(f"{tag()}{2*len(paths)} recordings pushed ({size/1e6:.1f} MB) in {time.monotonic()-start:.1f}s")
+
+# same picker as importFromDrive, through the local Downloads folder
+def importFromDevice(file):
+	waitUntil(id="import_test")
+	click(id="import_test", scroll=False)
+	waitUntil("175")
+	click("Downloads")
+	waitUntil("steplab")
+	click("steplab", scroll=False)
+	click(pushFolder(file), scroll=False)
+	waitUntil(visibleName(file))
+	click(text=visibleName(file))
+	waitUntil("Import Complete")
+	click("Ok", scroll = False)
+
+# the session still answers and StepLab is back on its main screen
+def healthy():
+	try:
+		return driver.current_package == "com.example.steplab" and bool(driver.find_elements(*locator(id="import_test")[0]))
+	except Exception:
+		return False
+
 def deleteTest():
 	waitUntil(id="send_test")
 	click(id="send_test", scroll=False)
@@ -329,7 +585,7 @@ def deleteTest():
 	click(id="delete_button", scroll = False)
 	waitUntil("Yes")
 	click("Yes", scroll = False)
-	time.sleep(1)
+	waitFor("dialog closed", lambda: not driver.find_elements(*locator("Yes")[0]), timeout=5)
 	driver.back()
 
 def staticTest(alg="Peak", filt="Butterworth"):
@@ -338,15 +594,42 @@ def staticTest(alg="Peak", filt="Butterworth"):
 	click(id="add_configuration")
 	click(id="start_comparison")
 	click(id="select", scroll = False) #the blue arrow
-	time.sleep(5) #waitUntil(id="steps") #
-	steps = read("steps")
+	steps = waitFor("steps", stepsSettled()) or read("steps")
 	driver.back()
 	return int(steps)
 
-def test_A(file):
-	importFromDrive(file)
+# condition on the steps text: a number that did not change for STEPS_SETTLE
+# after moving away from the first number shown, or that stayed the first
+# number for STEPS_FIRST (a comparison already done when the screen opened)
+def stepsSettled():
+	seen = {"first": None, "text": None, "since": time.monotonic()}
+	def settled():
+		found = driver.find_elements(*locator(id="steps")[0])
+		text = found[0].text.strip() if found else None
+		now = time.monotonic()
+		if not (text and text.isdigit()):
+			return False
+		if seen["first"] is None:
+			seen["first"], seen["text"], seen["since"] = text, text, now
+			return False
+		if text != seen["text"]:
+			seen["text"], seen["since"] = text, now
+			return False
+		wait = STEPS_SETTLE if text != seen["first"] else STEPS_FIRST
+		return text if now - seen["since"] >= wait else False
+	return settled
+
+def test_A(file, phases=None):
+	phases = Phases() if phases is None else phases
+	if args.push:
+		importFromDevice(file)
+	else:
+		importFromDrive(file)
+	phases.mark("navigation")
 	steps = staticTest("Peak", "Butterworth")
+	phases.mark("read")
 	deleteTest()
+	phases.mark("cleanup")
 	return steps
 
 '''
@@ -372,24 +655,27 @@ def staticTests(files):
 		if wasCreated:
 			writer.writerow(["file", "a", "a_interp"])
 
-		for i, path in enumerate(files, start=1):
-			if i%8==0:
+		def verify(path):
+			phases = Phases()
+			# every worker resets its own session: with --push only when it
+			# stopped answering, the drive picker needs it every 8 files
+			driver.tests += 1
+			if (not healthy()) if args.push else driver.tests%8==0:
 				resetDriver()
+			phases.mark("reset")
 
 			file = os.path.basename(path)
 			interpFile = "i_" + file
 
-			print(f"A  = ", end="", flush=True)
-
-			a = test_A(file) # camminata importata
-
-			print(f"{a} / A' = ", end="", flush=True)
+			a = test_A(file, phases) # camminata importata
+			a_interp = test_A(interpFile, phases) # interpolazione importata
 
-			a_interp = test_A(interpFile) # interpolazione importata
+			print(f"{tag()}{file}: A = {a} / A' = {a_interp}    A-A' =   {a-a_interp}")
 
-			print(f"{a_interp}    A-A' =   {a-a_interp}")
+			record(f, writer, "static", [file,a,a_interp], phases)
 
-			writer.writerow([file,a,a_interp])
+		runJobs(files, verify, (lambda: pushRecordings(files)) if args.push else None)
+	store.exportCsv("static", OUTPUT_STATIC)
 
 # -------- SensorCSV --------
 
@@ -402,44 +688,67 @@ def startReina(magnitude, frequency, delay):
 def stopReina():
 	click("Stop and Save")
 
+# iterations are the outer loop, so parallel workers never run the same
+# magnitude/frequency/delay at once and mock.py log numbering stays unique
 def testMockInjection():
-	click("Injection")
-	for i in range(ITERATIONS):
-		for magnitude in MAGNITUDES:
-			for frequency in FREQUENCIES:
-				for delay in DELAYS:
-					print(f"- {magnitude}_{frequency}_{delay} {i}")
-					startReina(magnitude, frequency, delay)
-					try:
-						subprocess.run(
-							["python3", dirPath+"repo/mock.py", magnitude, frequency, delay],
-							stdout=subprocess.DEVNULL,
-							stderr=subprocess.STDOUT,
-							text=True,
-							check=True
-						)
-					except Exception as e:
-						print(f"Error from mock.py: {e}")
-						exit(1)
-					stopReina()
+	jobs = [
+		(i, magnitude, frequency, delay)
+		for i in range(ITERATIONS)
+		for magnitude in MAGNITUDES
+		for frequency in FREQUENCIES
+		for delay in DELAYS
+	]
+	runJobs(jobs, mockTest, setup=lambda: click("Injection"))
+
+def mockTest(job):
+	i, magnitude, frequency, delay = job
+	print(f"{tag()}- {magnitude}_{frequency}_{delay} {i}")
+	phases = Phases()
+	startReina(magnitude, frequency, delay)
+	phases.mark("navigation")
+	try:
+		if args.daemon:
+			daemonRun("mock", [magnitude, frequency, delay])
+		else:
+			subprocess.run(
+				["python3", dirPath+"repo/mock.py", magnitude, frequency, delay] + emulatorArgs(),
+				stdout=subprocess.DEVNULL,
+				stderr=subprocess.STDOUT,
+				text=True,
+				check=True
+			)
+	except Exception as e:
+		print(f"Error from mock.py: {e}")
+		exit(1)
+	phases.mark("injection")
+	stopReina()
+	phases.mark("read")
+	store.addTiming("mock", f"{magnitude}_{frequency}_{delay}", "mock", phases, MOCK_SECONDS)
 
 # -------- Main --------
 
+# remaining files in the order to run them: longest first, and with
+# --window only the complete files that fit in it
+def schedule(costs, workers):
+	window = args.window * 3600 if args.window else None
+	order, seconds = plan(costs, window, workers)
+	if window is not None:
+		print(f"Planned: {len(order)} / {len(costs)} files in the {args.window}h window")
+	printEstimate(seconds)
+	return order
+
 def countProgressLive(realFiles):
-	if os.path.exists(OUTPUT_LIVE):
-		with open(OUTPUT_LIVE, "r", newline="") as f:
-			reader = csv.reader(f)
-			for row in reader:
-				file, mode, sampling, alg, steps = row
-				if (any(file == os.path.basename(rf) for rf in realFiles) and
-					any(mode == m for m in INTERPS) and
-					any(sampling == m for m in SAMPLINGS) and
-					any(alg == f"{a}+{filt}" for a, filt in ALGORITHMS)):
-					alreadyTested[(file, mode, sampling, alg)] += 1
-		# number capped at the repetitions we're interested in achieving
-		for test in alreadyTested:
-			if alreadyTested[test] >= REPETITIONS:
-				alreadyTested[test] = REPETITIONS
+	# the first campaign with a store starts from the existing csv
+	store.importCsv("live", OUTPUT_LIVE)
+	counts = store.liveCounts()
+	for rf in realFiles:
+		for mode in INTERPS:
+			for sampling in SAMPLINGS:
+				for a, filt in ALGORITHMS:
+					test = (os.path.basename(rf), mode, sampling, f"{a}+{filt}")
+					if test in counts:
+						# number capped at the repetitions we're interested in achieving
+						alreadyTested[test] = min(counts[test], REPETITIONS)
 
 	tested = sum(alreadyTested.values())
 	total = len(realFiles) * len(ALGORITHMS) * REPETITIONS * len(INTERPS) * len(SAMPLINGS)
@@ -447,52 +756,58 @@ def countProgressLive(realFiles):
 	#	total -= len(realFiles) * len(ALGORITHMS) * REPETITIONS * len([alg for alg in INTERPS if "50" in alg])
 	print(f"Already tested: {tested} / {total}")
 
-	seconds = 38 * (total - tested)
-	hours = seconds // 3600
-	mins = (seconds % 3600) // 60
-	print(f"Estimated time: {hours}h {mins}m")
+	# measured phases of earlier tests, the injection scales with the recording
+	means = store.phaseMeans("live")
+	costs = {}
+	for rf in realFiles:
+		perFile = len(ALGORITHMS) * REPETITIONS * len(INTERPS) * len(SAMPLINGS)
+		remaining = perFile - sum(alreadyTested[(os.path.basename(rf), m, s, f"{a}+{filt}")]
+			for m in INTERPS for s in SAMPLINGS for a, filt in ALGORITHMS)
+		if remaining > 0:
+			costs[rf] = remaining * testSeconds(means, recordingSeconds(rf), LIVE_SECONDS)
+	order = schedule(costs, len(args.emulators or [None]))
 
 	startInjection = input("Are you sure you can start this session? (y/n) ")
 	if startInjection.lower() != "y":
 		quit(0)
+	return order
 
 def countProgressStatic(paths):
-	if not os.path.exists(OUTPUT_STATIC):
-		return
-	with open(OUTPUT_STATIC, newline="") as f:
-		reader = csv.reader(f)
-		next(reader, None)
-		for row in reader:
-			if row:
-				alreadyVerified.add(row[0])
+	store.importCsv("static", OUTPUT_STATIC)
+	alreadyVerified.update(store.verified())
 
 	total = len(paths)
 	tested = len(alreadyVerified)
 	print(f"Already tested: {tested} / {total}")
 
-	seconds = 90 * (total - tested)
-	hours = seconds // 3600
-	mins = (seconds % 3600) // 60
-	print(f"Estimated time: {hours}h {mins}m")
+	means = store.phaseMeans("static", staticMode())
+	costs = {
+		path: testSeconds(means, recordingSeconds(path), PUSH_SECONDS if args.push else STATIC_SECONDS)
+		for path in paths if os.path.basename(path) not in alreadyVerified
+	}
+	order = schedule(costs, len(args.emulators or [None]))
 
 	startInjection = input("Are you sure you can start this session? (y/n) ")
 	if startInjection.lower() != "y":
 		quit(0)
+	return order
 
 if __name__ == "__main__":
+	store = ProgressStore(PROGRESS_DB)
 	if(args.app == "steplab_live"):
-		countProgressLive(glob.glob(interpPath))
+		paths = countProgressLive(glob.glob(interpPath))
 	elif(args.app == "steplab_static"):
-		countProgressStatic(glob.glob(walksPath))
+		paths = countProgressStatic(glob.glob(walksPath))
 	
 	appium_proc = start_appium()
-	createDriver()
+	if not args.emulators:
+		createDriver()
 
 	try:
 		if args.app == "steplab_live":
-			liveTests(glob.glob(interpPath))
+			liveTests(paths)
 		elif args.app == "steplab_static":
-			staticTests(glob.glob(walksPath))
+			staticTests(paths)
 		elif args.app == "sensorcsv":
 			testMockInjection()
 		quitAll(0)
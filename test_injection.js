@@ -344,6 +344,8 @@ async function injectExactFromCsv(driver, csvPath) {
 		const wait = due - nowMsMono();
 		if (wait > 0) await sleep(wait);
 
+		// execEmuConsoleCommand takes one command per request, so the commands of a row
+		// cannot be batched like in inject.py: they are awaited one by one to keep their order
 		if (hasMag) await emuCmd(driver, `sensor set magnetic-field ${mag[0]}:${mag[1]}:${mag[2]}`);
 		if (hasAcc) await emuCmd(driver, `sensor set acceleration ${acc[0]}:${acc[1]}:${acc[2]}`);
 		if (hasGyr) await emuCmd(driver, `sensor set gyroscope ${gyr[0]}:${gyr[1]}:${gyr[2]}`);
@@ -1,85 +1,113 @@
-import subprocess
-import time
+import os
+import hashlib
+import zipfile
+from bisect import bisect_right
 import numpy as np
-from scipy.interpolate import CubicSpline, PchipInterpolator
+from recording import Recording
 
 ######## -------- ANDROID EMULATOR -------- ########
 
-EMULATOR_HOST = "localhost"
-EMULATOR_PORT = 5554
-
-proc = subprocess.Popen(
-	["nc", EMULATOR_HOST, str(EMULATOR_PORT)],
-	stdin=subprocess.PIPE,
-	stdout=subprocess.PIPE,
-	stderr=subprocess.STDOUT,
-	text=True,
-	bufsize=1
-)
-
-def send(cmd: str, verbose: bool = False):
-	proc.stdin.write(cmd + "\n")
-	proc.stdin.flush()
-	if verbose:
-		out = proc.stdout.readline().strip()
-		print(f"{time.time():.3f}> {cmd}")
-		if out != "OK": print(out)
+from androidEmulator import EMULATOR_HOST, EMULATOR_PORT, connect, addArguments, histograms, setDeadband, suppressed, send, send_many, send_prepared, prepare
 
 ######## -------- MOCK MODEL -------- ########
 
-G = 9.80665  # m/s^2
-
-class AccelerometerModel:
-	def __init__(self, n_waves=5, seed=2, magnitude=(3.0, -2.0, 2.0)):
-		rng = np.random.default_rng(seed)
-		self.n = n_waves
-		self.amps = rng.uniform(magnitude[1], magnitude[2], size=(n_waves, 3))
-		self.freqs = rng.uniform(0.1, 8.0, size=n_waves)
-		self.phases = rng.uniform(0, 2*np.pi, size=(n_waves, 3))
-		
-		self.amps[0] = magnitude[0]
-		self.freqs[0] = 2.0
-		self.phases[0] = 0
-
-	def value(self, t):
-		t = np.asarray(t)
-		acc = np.zeros(t.shape + (3,))
-		for k in range(self.n):
-			omega = 2 * np.pi * self.freqs[k]
-			acc += self.amps[k] * np.sin(omega * t[..., None] + self.phases[k])
-		
-		acc[..., 2] += G
-		return acc
-
-def getModel(magnitude: str):
-	if (magnitude=="Lower"):
-		return AccelerometerModel(magnitude=(2.5,-2.0,2.0))
-	if (magnitude=="Normal"):
-		return AccelerometerModel(magnitude=(4.5, -3.5, 3.5))
-	if (magnitude=="Higher"):
-		return AccelerometerModel(magnitude=(10.0, -6.0, 6.0))
-	else:
-		raise ValueError("unknown magnitude")
+from sensormodel import G, AccelerometerModel, getModel
 
 ######## -------- INTERPOLATION -------- ########
 
 S2NS = 1000000000
 
+# fitted splines are cached by content hash of the source csv and spline kind,
+# the least recently used entries are removed above CACHE_MAX_BYTES
+CACHE_DIR = os.environ.get("SENSOR_CACHE_DIR", os.path.expanduser("~/.cache/sensorinjection"))
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_VERSION = 1
+
+def fileDigest(path):
+	h = hashlib.sha1()
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(1 << 20), b""):
+			h.update(block)
+	return h.hexdigest()
+
+def evictCache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+	entries = []
+	for name in os.listdir(cache_dir):
+		path = os.path.join(cache_dir, name)
+		try:
+			st = os.stat(path)
+		except OSError:
+			continue
+		entries.append((st.st_mtime, st.st_size, path))
+	total = sum(size for _, size, _ in entries)
+	for _, size, path in sorted(entries):
+		if total <= max_bytes:
+			break
+		try:
+			os.remove(path)
+		except OSError:
+			pass
+		total -= size
+
 class InterpolationModel:
-	def __init__(self, file, kind="cubic"):
-		data = np.loadtxt(file, delimiter=",", skiprows=1, usecols=[0,1,2,3]) #, usecols=[0,1,2,3] may need to remove excess columns from origin walk
+	def __init__(self, file, kind="cubic", cache_dir=CACHE_DIR):
+		self.hasNano = False
+		self._spline = None
+		cached = None
+		if cache_dir:
+			cached = os.path.join(cache_dir, f"{fileDigest(file)}_{kind}_v{CACHE_VERSION}.npz")
+		if not (cached and self._load(cached)):
+			self._fit(file, kind)
+			if cached:
+				self._store(cached, cache_dir)
+
+		# plain python copies of the piecewise polynomial for the scalar path:
+		# one bisect and a horner step per axis instead of a scipy call
+		self._breaks = self._x.tolist()
+		self._coeffs = self._c.transpose(1, 0, 2).tolist() # [interval][power][axis]
+
+	# scipy is only imported for fitting and for the vectorized values_ns,
+	# a cached model injects without it
+	@property
+	def spline(self):
+		if self._spline is None:
+			from scipy.interpolate import PPoly
+			self._spline = PPoly.construct_fast(self._c, self._x, axis=0)
+		return self._spline
+
+	def _load(self, cached):
+		try:
+			with np.load(cached) as npz:
+				self._x = npz["x"]
+				self._c = npz["c"]
+				self.t_max = npz["t_max"][()]
+			os.utime(cached) # recently used
+			return True
+		except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+			return False
+
+	def _store(self, cached, cache_dir):
+		try:
+			os.makedirs(cache_dir, exist_ok=True)
+			tmp = f"{cached}.{os.getpid()}.tmp.npz"
+			np.savez(tmp, x=self._x, c=self._c, t_max=self.t_max)
+			os.replace(tmp, cached)
+			evictCache(cache_dir)
+		except OSError as e:
+			print(f"WARNING: spline cache not written: {e}")
+
+	def _fit(self, file, kind):
+		from scipy.interpolate import CubicSpline, PchipInterpolator
+		recording = Recording(file)
+		data = recording.load([0,1,2,3]) # may need to remove excess columns from origin walk
+		recording.close()
 
 		# first column is in milliseconds since epoch
 		# convert to nanoseconds since start
 		timestamps = (data[:,0] - data[:,0].min()) * 1000000
 		
-		ax = data[:, 1]
-		ay = data[:, 2]
-		az = data[:, 3]
-		
 		# fourth column is nanoseconds.
 		# not present in recorded "real" files as it was added later
-		self.hasNano = False
 		#try:
 		#	timestamps = data[:,4] - data[:,4].min()
 		#	self.hasNano = True
@@ -90,24 +118,45 @@ class InterpolationModel:
 			raise ValueError("Timestamps not monotonic??")
 
 		self.t_max = timestamps[-1]
+		xyz = data[:, 1:4]
 		if(kind == "pchip"):
-			self.spline_ax = PchipInterpolator(timestamps, ax)
-			self.spline_ay = PchipInterpolator(timestamps, ay)
-			self.spline_az = PchipInterpolator(timestamps, az)
+			self._spline = PchipInterpolator(timestamps, xyz, axis=0)
 		else: # cubic
-			self.spline_ax = CubicSpline(timestamps, ax, bc_type="natural")
-			self.spline_ay = CubicSpline(timestamps, ay, bc_type="natural")
-			self.spline_az = CubicSpline(timestamps, az, bc_type="natural")
+			self._spline = CubicSpline(timestamps, xyz, axis=0, bc_type="natural")
+		self._x = self._spline.x
+		self._c = self._spline.c
+
+	def values_ns(self, t):
+		t = np.asarray(t)
+		if t.size and (t.min() < 0 or t.max() > self.t_max):
+			raise ValueError(f"interpolation out of bounds, received [{t.min()/S2NS}s, {t.max()/S2NS}s], expected in range [0, {self.t_max/S2NS}s]")
+		return self.spline(t)
 
 	def value_ns(self, t):
 		if t < 0 or t > self.t_max:
 			raise ValueError(f"interpolation out of bounds, received {t/S2NS}s, expected in range [0, {self.t_max/S2NS}s]")
 
+		i = min(bisect_right(self._breaks, t), len(self._coeffs)) - 1
+		dt = t - self._breaks[i]
+		c3, c2, c1, c0 = self._coeffs[i]
 		return (
-			float(self.spline_ax(t)),
-			float(self.spline_ay(t)),
-			float(self.spline_az(t)),
+			((c3[0]*dt + c2[0])*dt + c1[0])*dt + c0[0],
+			((c3[1]*dt + c2[1])*dt + c1[1])*dt + c0[1],
+			((c3[2]*dt + c2[2])*dt + c1[2])*dt + c0[2],
 		)
 
 	def duration_ns(self):
-		return self.t_max
\ No newline at end of file
+		return self.t_max
+# models already built by this process, for callers that inject many times
+# (injectDaemon.py). a file changed on disk is fitted or loaded again.
+models = {}
+MODELS_MAX = 64
+
+def loadModel(file, kind="cubic", cache_dir=CACHE_DIR):
+	st = os.stat(file)
+	key = (os.path.abspath(file), kind, st.st_mtime_ns, st.st_size)
+	if key not in models:
+		if len(models) >= MODELS_MAX:
+			models.pop(next(iter(models))) # oldest first
+		models[key] = InterpolationModel(file, kind, cache_dir)
+	return models[key]